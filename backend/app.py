@@ -1,12 +1,97 @@
 import os
+import json
+import time
+import random
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-from model import generate, unique_chars, BOS, n_layer
+import model
+from model import block_size
+from service import get_service, Overloaded
+from response_cache import ResponseCache
+from introspect import Recorder, encode
+import metrics
 
 app = Flask(__name__)
 CORS(app)
 
+# nothing is loaded here: /vocab and /tokenize only need the vocab sidecar,
+# the weights load on first use or through start_loading() (see __main__
+# below and gunicorn.conf.py); /ready says when they are in
+lm = model.get_model()
+
+# responses of seeded requests, keyed on every input plus the model version
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 3600)),
+)
+
+# ─── INSTRUMENTATION ─────────────────────────
+# per-route latency histograms and optional per-request cProfile (see
+# metrics.py); streamed responses are timed up to their first byte
+profiler = metrics.RequestProfiler(
+    allow=os.environ.get('PROFILE_REQUESTS', '0') == '1',
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    top=int(os.environ.get('PROFILE_TOP', 25)),
+)
+
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    g.profile = None
+    if profiler.wanted(request.args.get('profile') == '1'):
+        g.profile = profiler.start()
+
+@app.after_request
+def finish_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if g.get('profile') is not None:
+        profiler.finish(g.profile, f"{request.method} {request.full_path}")
+    if 'start' in g:
+        metrics.request_seconds.observe(time.perf_counter() - g.start,
+                                        (route, request.method, str(response.status_code)))
+    return response
+
+def cache_lookups():
+    prefix, responses = lm.prefix_cache.stats(), response_cache.stats()
+    return {
+        ('prefix', 'hit'): prefix['hits'],
+        ('prefix', 'partial'): prefix['partial_hits'],
+        ('prefix', 'miss'): prefix['misses'],
+        ('response', 'hit'): responses['hits'],
+        ('response', 'miss'): responses['misses'],
+    }
+
+metrics.registry.gauge('microgpt_cache_lookups_total', 'prefix KV cache and response cache lookups',
+                       cache_lookups, ('cache', 'result'), kind='counter')
+metrics.registry.gauge('microgpt_cache_entries', 'entries held per cache',
+                       lambda: {('prefix',): lm.prefix_cache.stats()['entries'],
+                                ('response',): response_cache.stats()['entries']}, ('cache',))
+metrics.registry.gauge('microgpt_prefix_cache_bytes', 'estimated size of the prefix KV cache',
+                       lambda: lm.prefix_cache.stats()['bytes'])
+metrics.registry.gauge('microgpt_prefix_cache_evictions_total', 'prefix KV cache nodes evicted',
+                       lambda: lm.prefix_cache.stats()['evictions'], kind='counter')
+def draft_tokens():
+    stats = lm.speculative_stats()
+    return {('accepted',): stats['accepted'], ('rejected',): stats['proposed'] - stats['accepted']}
+
+metrics.registry.gauge('microgpt_speculative_draft_tokens_total', 'speculative draft tokens checked',
+                       draft_tokens, ('result',), kind='counter')
+metrics.registry.gauge('microgpt_model_version', 'bumped whenever the served weights change',
+                       lambda: lm.model_version)
+
+def seed_param(args):
+    # optional integer seed; each request samples from its own rng either way
+    seed = args.get('seed')
+    return int(seed) if seed is not None else None
+
+def prefix_error(prefix):
+    # shared by /generate, /generate/stream and /inspect: the prompt takes
+    # one position per char plus the step that predicts the next one
+    if len(prefix) >= block_size:
+        return f'prefix longer than {block_size - 1} characters'
+    return None
+
 # ─── HOME ROUTE ──────────────────────────────
 @app.route('/')
 def home():
@@ -14,128 +99,334 @@ def home():
         'status': 'microGPT API running',
         'endpoints': {
             '/generate': 'GET - generate startup names',
-            '/tokenize': 'GET - tokenize a prefix',
-            '/vocab': 'GET - get vocabulary info'
+            '/tokenize': 'GET - tokenize a prefix, POST - tokenize many strings',
+            '/score': 'POST - log-likelihood and perplexity of many names',
+            '/vocab': 'GET - get vocabulary info',
+            '/inspect': 'GET - embeddings and attention weights for a prefix',
+            '/metrics': 'GET - prometheus metrics',
+            '/ready': 'GET - 200 once the weights are loaded, 503 before'
         }
     })
 
 # ─── GENERATE ROUTE ──────────────────────────
-@app.route('/generate', methods=['GET'])
-def generate_names():
-    prefix = request.args.get('prefix', '')
-    temperature = float(request.args.get('temperature', 0.5))
-    count = int(request.args.get('count', 5))
+def generate_params(args):
+    # raises ValueError on malformed numbers
+    return (
+        args.get('prefix', ''),
+        float(args.get('temperature', 0.5)),
+        int(args.get('count', 5)),
+        seed_param(args),
+        # speculative=1: same distribution, drafted by the n-gram model
+        args.get('speculative', '0') == '1',
+        # unique=1: `count` distinct names that are not in the training data
+        args.get('unique', '0') == '1',
+    )
 
-    results = []
-    for _ in range(count):
-        name = generate(prefix, temperature)
-        results.append(name)
+def generate_cache_key(prefix, temperature, count, seed, speculative, unique):
+    # a seeded request is deterministic, so repeats are served from cache
+    if seed is None:
+        return None
+    return ('generate', prefix, temperature, count, seed, speculative, unique, lm.model_version)
 
-    return jsonify({
+def generate_response(prefix, temperature, seed, unique, results, cache_key):
+    response = {
         'prefix': prefix,
         'temperature': temperature,
-        'results': results
-    })
+    }
+    if unique:
+        # fewer than count results means the sample budget ran out
+        results, response['discarded'] = results
+    response['results'] = results
+    if cache_key is not None:
+        response['seed'] = seed
+        response_cache.put(cache_key, response)
+    return response
+
+@app.route('/generate', methods=['GET'])
+def generate_names():
+    try:
+        params = generate_params(request.args)
+    except ValueError:
+        return jsonify({'error': 'invalid parameters'}), 400
+    prefix, temperature, count, seed, speculative, unique = params
+    error = prefix_error(prefix)
+    if error is not None:
+        return jsonify({'error': error}), 400
+    cache_key = generate_cache_key(*params)
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+
+    # INFERENCE_WORKERS > 0 runs generation on the process pool
+    # (under asgi.py those requests never reach flask)
+    service = get_service()
+    if service is None:
+        rng = random.Random(seed)
+        if unique:
+            results = lm.generate_unique(prefix, temperature, count, rng, speculative)
+        else:
+            results = lm.generate_names(prefix, temperature, count, rng, speculative)
+    else:
+        try:
+            results = service.generate(prefix, temperature, count, seed, speculative, unique)
+        except Overloaded:
+            return jsonify({'error': 'server busy, try again'}), 503
+        except TimeoutError:
+            return jsonify({'error': 'generation timed out'}), 504
+
+    return jsonify(generate_response(prefix, temperature, seed, unique, results, cache_key))
 
 # ─── TOKENIZE ROUTE ──────────────────────────
+def token_list(text, ids):
+    # unknown characters keep id None
+    return [{'char': ch, 'id': i} for ch, i in zip(text, ids)]
+
 @app.route('/tokenize', methods=['GET'])
 def tokenize():
     text = request.args.get('text', '')
-    
-    tokens = []
-    for ch in text.lower():
-        if ch in unique_chars:
-            tokens.append({
-                'char': ch,
-                'id': unique_chars.index(ch)
-            })
-        else:
-            tokens.append({
-                'char': ch,
-                'id': None
-            })
+    lower = text.lower()
 
     return jsonify({
         'text': text,
-        'tokens': tokens
+        'tokens': token_list(lower, lm.tokenizer.encode_lenient(lower))
     })
 
+@app.route('/tokenize', methods=['POST'])
+def tokenize_batch():
+    # body: {"texts": ["snap", "cred", ...]}
+    data = request.get_json(silent=True) or {}
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({'error': 'expected JSON body {"texts": [string, ...]}'}), 400
+
+    lowered = [t.lower() for t in texts]
+    batch = lm.tokenizer.encode_batch(lowered, lenient=True)
+    results = []
+    for text, lower, ids in zip(texts, lowered, batch):
+        results.append({
+            'text': text,
+            'tokens': token_list(lower, ids),
+            'valid': None not in ids
+        })
+    return jsonify({'results': results})
+
+# ─── SCORE ROUTE ─────────────────────────────
+@app.route('/score', methods=['POST'])
+def score():
+    # body: {"texts": ["snapdeal", "zomato", ...]}
+    # per text: total log prob (natural log, including the end of the name),
+    # per-character log probs, the end-of-name log prob and perplexity
+    data = request.get_json(silent=True) or {}
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({'error': 'expected JSON body {"texts": [string, ...]}'}), 400
+    return jsonify({'results': lm.score([t.lower() for t in texts])})
+
 # ─── VOCAB ROUTE ─────────────────────────────
 @app.route('/vocab', methods=['GET'])
 def vocab():
     return jsonify({
-        'unique_chars': unique_chars,
-        'vocab_size': len(unique_chars) + 1,
-        'BOS': BOS
+        'unique_chars': lm.unique_chars,
+        'vocab_size': lm.vocab_size,
+        'BOS': lm.BOS
     })
 
-# ─── STREAM GENERATE ─────────────────────────
-@app.route('/generate/stream', methods=['GET'])
-def generate_stream():
-    from flask import Response
-    import time
+# ─── INSPECT ROUTE ───────────────────────────
+def record_prefix(token_ids):
+    # uncached forward pass over token_ids that records the internals
+    engine = lm.load().engine
+    recorder = Recorder.for_engine(engine, block_size)
+    keys = [[] for _ in range(engine.n_layer)]
+    values = [[] for _ in range(engine.n_layer)]
+    logits = None
+    for pos_id, token_id in enumerate(token_ids):
+        logits = engine.gpt(token_id, pos_id, keys, values, recorder)
+    return recorder, keys, values, logits
+
+def token_frame(token_ids, start=0):
+    return [{'position': start + i, 'char': lm.tokenizer.itos[t], 'id': t} for i, t in enumerate(token_ids)]
 
+@app.route('/inspect', methods=['GET'])
+def inspect():
+    # the prompt is fed like /generate feeds it: one position per prefix
+    # char, then the last char again at position len(prefix) (a lone BOS
+    # for an empty prefix); next_probs are the logits of that last step
     prefix = request.args.get('prefix', '')
     temperature = float(request.args.get('temperature', 0.5))
+    unknown = lm.tokenizer.unknown(prefix)
+    if unknown is not None:
+        return jsonify({'error': f'unknown character: {unknown}'}), 400
+    error = prefix_error(prefix)
+    if error is not None:
+        return jsonify({'error': error}), 400
+
+    prefix_ids = lm.tokenizer.encode(prefix)
+    token_ids = prefix_ids + [prefix_ids[-1] if prefix_ids else lm.BOS]
+    recorder, _, _, logits = record_prefix(token_ids)
+    probs = lm.engine.probs(logits, temperature)
+    return jsonify({
+        'prefix': prefix,
+        'tokens': token_frame(token_ids),
+        'embeddings': recorder.embedding_arrays(),
+        'attention': recorder.attention_array(),
+        'next_probs': encode(probs, (len(probs),)),
+    })
+
+# ─── STREAM GENERATE ─────────────────────────
+def sse(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+def stream_frames(prefix, temperature, rng, inspect=False):
+    # yields SSE frames; each probs frame costs one gpt() step, so callers
+    # can pace (or offload) the work frame by frame.
+    # inspect=True adds 'inspect' frames with the embeddings and attention
+    # weights of the positions just computed: one for the prefix, then one
+    # before every probs frame
+    sample = list(prefix)
+    engine, tokenizer, BOS = lm.load().engine, lm.tokenizer, lm.BOS
+    unique_chars = tokenizer.chars
+
+    unknown = tokenizer.unknown(prefix)
+    if unknown is not None:
+        yield f"data: ERROR unknown char {unknown}\n\n"
+        return
+    prefix_ids = tokenizer.encode(prefix)
+    recorder = None
+    if inspect:
+        # the prefix has to be recomputed to be recorded, so skip the cache
+        recorder, keys, values, _ = record_prefix(prefix_ids)
+        if prefix_ids:
+            yield sse({
+                'type': 'inspect',
+                'tokens': token_frame(prefix_ids),
+                'embeddings': recorder.embedding_arrays(),
+                'attention': recorder.attention_array(),
+            })
+    else:
+        keys, values = lm.prefill(prefix_ids)
+
+    if prefix:
+        start_pos = len(prefix)
+        token_id = prefix_ids[-1]
+    else:
+        start_pos = 0
+        token_id = BOS
+
+    clock = time.perf_counter
+    for pos_id in range(start_pos, block_size):
+        t0 = clock()
+        logits = engine.gpt(token_id, pos_id, keys, values, recorder)
+        t1 = clock()
+        probs = engine.probs(logits, temperature)
+        t2 = clock()
+
+        if recorder is not None:
+            yield sse({
+                'type': 'inspect',
+                'tokens': token_frame([token_id], pos_id),
+                'embeddings': recorder.embedding_arrays(pos_id, pos_id + 1),
+                'attention': recorder.attention_array(pos_id, pos_id + 1),
+            })
+
+        # send probabilities for animation
+        yield sse({
+            'type': 'probs',
+            'probs': [
+                {
+                    'char': unique_chars[i] if i < len(unique_chars) else 'BOS',
+                    'prob': round(p * 100, 2)
+                }
+                for i, p in enumerate(probs)
+            ]
+        })
+
+        t3 = clock()
+        token_id = rng.choices(
+            range(len(probs)),
+            weights=probs
+        )[0]
+        # one frame at a time: the client may disconnect after any of them
+        metrics.stages(gpt=(t1 - t0, 1), softmax=(t2 - t1, 1), sample=(clock() - t3, 1))
+        metrics.tokens_generated.inc()
+
+        if token_id == BOS:
+            yield sse({'type': 'done', 'result': ''.join(sample)})
+            return
+
+        sample.append(tokenizer.itos[token_id])
+        yield sse({'type': 'char', 'char': tokenizer.itos[token_id], 'word': ''.join(sample)})
+
+    yield sse({'type': 'done', 'result': ''.join(sample)})
+
+def cached_stream_frames(prefix, temperature, seed, inspect=False):
+    # seeded streams are recorded and replayed from the response cache
+    if seed is None:
+        yield from stream_frames(prefix, temperature, random.Random(), inspect)
+        return
+
+    cache_key = ('stream', prefix, temperature, seed, inspect, lm.model_version)
+    frames = response_cache.get(cache_key)
+    if frames is not None:
+        yield from frames
+        return
+
+    frames = []
+    for frame in stream_frames(prefix, temperature, random.Random(seed), inspect):
+        frames.append(frame)
+        yield frame
+    response_cache.put(cache_key, frames)
+
+def stream_params(args):
+    # delay: optional pause in seconds between frames (defaults to none);
+    # the frontend paces its own animation. inspect=1 adds inspect frames
+    return (
+        args.get('prefix', ''),
+        float(args.get('temperature', 0.5)),
+        max(0.0, float(args.get('delay', 0))),
+        seed_param(args),
+        args.get('inspect', '0') == '1',
+    )
+
+@app.route('/generate/stream', methods=['GET'])
+def generate_stream():
+    try:
+        prefix, temperature, delay, seed, inspect = stream_params(request.args)
+    except ValueError:
+        return jsonify({'error': 'invalid parameters'}), 400
+    error = prefix_error(prefix)
+    if error is not None:
+        return jsonify({'error': error}), 400
 
     def stream():
-        from model import gpt, softmax, n_layer, block_size
-        import random
-
-        keys = [[] for _ in range(n_layer)]
-        values = [[] for _ in range(n_layer)]
-        sample = list(prefix)
-
-        if prefix:
-            for pos_id, ch in enumerate(prefix):
-                if ch not in unique_chars:
-                    yield f"data: ERROR unknown char {ch}\n\n"
-                    return
-                token_id = unique_chars.index(ch)
-                gpt(token_id, pos_id, keys, values)
-            start_pos = len(prefix)
-            token_id = unique_chars.index(prefix[-1])
-        else:
-            start_pos = 0
-            token_id = BOS
-
-        for pos_id in range(start_pos, block_size):
-            logits = gpt(token_id, pos_id, keys, values)
-            probs = softmax([l / temperature for l in logits])
-
-            # send probabilities for animation
-            prob_data = {
-                'type': 'probs',
-                'probs': [
-                    {
-                        'char': unique_chars[i] if i < len(unique_chars) else 'BOS',
-                        'prob': round(p.data * 100, 2)
-                    }
-                    for i, p in enumerate(probs)
-                ]
-            }
-            import json
-            yield f"data: {json.dumps(prob_data)}\n\n"
-            time.sleep(0.3)  # pause so animation is visible
-
-            token_id = random.choices(
-                range(len(probs)),
-                weights=[p.data for p in probs]
-            )[0]
-
-            if token_id == BOS:
-                yield f"data: {json.dumps({'type': 'done', 'result': ''.join(sample)})}\n\n"
-                return
-
-            sample.append(unique_chars[token_id])
-            yield f"data: {json.dumps({'type': 'char', 'char': unique_chars[token_id], 'word': ''.join(sample)})}\n\n"
-            time.sleep(0.3)
-
-        yield f"data: {json.dumps({'type': 'done', 'result': ''.join(sample)})}\n\n"
+        for i, frame in enumerate(cached_stream_frames(prefix, temperature, seed, inspect)):
+            if i and delay:
+                time.sleep(delay)
+            yield frame
 
     return Response(stream(), mimetype='text/event-stream')
 
+# ─── READY ROUTE ─────────────────────────────
+def ready_status():
+    status = {'ready': lm.ready(), 'checkpoint': lm.checkpoint_path, 'model_version': lm.model_version}
+    if lm.load_error is not None:
+        status['error'] = str(lm.load_error)
+    return status, 200 if status['ready'] else 503
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    status, code = ready_status()
+    return jsonify(status), code
+
+# ─── METRICS ROUTE ───────────────────────────
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    return Response(metrics.registry.render(), mimetype=METRICS_CONTENT_TYPE)
+
 
 if __name__ == '__main__':
+    lm.start_loading()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
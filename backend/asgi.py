@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import asyncio
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import metrics
+from app import (app, cached_stream_frames, stream_params, ready_status, METRICS_CONTENT_TYPE,
+                 prefix_error, generate_params, generate_cache_key, generate_response, response_cache)
+from service import get_service, Overloaded
+
+# asyncio entry point.
+#   gunicorn asgi:application -k uvicorn_worker.UvicornWorker
+#
+# /generate/stream is served natively: each SSE session is a coroutine, so
+# thousands of open streams (and their pacing delays) cost no threads. the
+# cpu-bound gpt() step behind every frame runs on a small thread pool so it
+# never blocks the event loop. /ready and /metrics are answered on the loop
+# too, so probes and scrapes never queue behind model work. so is /generate
+# when INFERENCE_WORKERS runs it on the process pool: a request waiting for
+# its job holds no thread, and the pool's dispatcher sees every concurrent
+# request to micro-batch. every other route goes to the flask app, on
+# FLASK_THREADS threads.
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('STREAM_THREADS', 4)))
+
+# asgiref runs every wsgi request of a process on one shared thread
+# (sync_to_async's thread_sensitive default), so one long /score or
+# /generate would hold up every route behind it
+flask_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('FLASK_THREADS', 8)))
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+                                 thread_sensitive=False, executor=flask_executor)
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+flask_app = PooledWsgiToAsgi(app)
+
+_DONE = object()
+
+def next_frame(frames, submitted):
+    metrics.sse_frame_wait_seconds.observe(time.perf_counter() - submitted)
+    return next(frames, _DONE)
+
+# ─── STREAM ──────────────────────────────────
+async def generate_stream(scope, receive, send):
+    start = time.perf_counter()
+    args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+    try:
+        prefix, temperature, delay, seed, inspect = stream_params(args)
+        error = prefix_error(prefix)
+    except ValueError:
+        error = 'invalid parameters'
+    if error is not None:
+        await respond_json(send, 400, {'error': error})
+        metrics.request_seconds.observe(time.perf_counter() - start, ('/generate/stream', 'GET', '400'))
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+
+    disconnected = asyncio.Event()
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+    watcher = asyncio.ensure_future(watch_disconnect())
+
+    loop = asyncio.get_running_loop()
+    frames = cached_stream_frames(prefix, temperature, seed, inspect)
+    try:
+        first = True
+        while not disconnected.is_set():
+            frame = await loop.run_in_executor(executor, next_frame, frames, time.perf_counter())
+            if frame is _DONE:
+                break
+            if delay and not first:
+                await asyncio.sleep(delay)
+            first = False
+            await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        # the whole stream, pacing delays included
+        metrics.request_seconds.observe(time.perf_counter() - start, ('/generate/stream', 'GET', '200'))
+        watcher.cancel()
+        try:
+            frames.close()
+        except ValueError:
+            pass  # cancelled while a step was still running in the executor
+
+# ─── RESPONSES ───────────────────────────────
+async def respond(send, status, body, content_type):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode()),
+                            (b'access-control-allow-origin', b'*')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def respond_json(send, status, data):
+    await respond(send, status, json.dumps(data).encode(), 'application/json')
+
+# ─── GENERATE ────────────────────────────────
+async def generate(scope, receive, send):
+    service = get_service()
+    if service is None:
+        # generation runs in this process: a blocking call, so flask's threads
+        await flask_app(scope, receive, send)
+        return
+
+    start = time.perf_counter()
+    status, body = await generate_pooled(service, scope)
+    await respond_json(send, status, body)
+    metrics.request_seconds.observe(time.perf_counter() - start, ('/generate', 'GET', str(status)))
+
+async def generate_pooled(service, scope):
+    args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+    try:
+        params = generate_params(args)
+    except ValueError:
+        return 400, {'error': 'invalid parameters'}
+    prefix, temperature, count, seed, speculative, unique = params
+    error = prefix_error(prefix)
+    if error is not None:
+        return 400, {'error': error}
+    cache_key = generate_cache_key(*params)
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return 200, cached
+
+    try:
+        job = service.submit(prefix, temperature, count, seed, speculative, unique)
+    except Overloaded:
+        return 503, {'error': 'server busy, try again'}
+    try:
+        # a timeout cancels the job if it is still queued
+        results = await asyncio.wait_for(asyncio.wrap_future(job), service.timeout)
+    except TimeoutError:
+        return 504, {'error': 'generation timed out'}
+    return 200, generate_response(prefix, temperature, seed, unique, results, cache_key)
+
+# ─── READY AND METRICS ───────────────────────
+
+async def ready(scope, receive, send):
+    start = time.perf_counter()
+    status, code = ready_status()
+    await respond_json(send, code, status)
+    metrics.request_seconds.observe(time.perf_counter() - start, ('/ready', 'GET', str(code)))
+
+async def metrics_route(scope, receive, send):
+    start = time.perf_counter()
+    await respond(send, 200, metrics.registry.render().encode(), METRICS_CONTENT_TYPE)
+    metrics.request_seconds.observe(time.perf_counter() - start, ('/metrics', 'GET', '200'))
+
+# ─── APP ─────────────────────────────────────
+NATIVE_ROUTES = {
+    '/generate': generate,
+    '/generate/stream': generate_stream,
+    '/ready': ready,
+    '/metrics': metrics_route,
+}
+
+async def application(scope, receive, send):
+    route = NATIVE_ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+    if route is not None:
+        await route(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
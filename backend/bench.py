@@ -0,0 +1,264 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import model
+import tensor
+from tape import Compiled
+
+# offline performance benchmarks.
+#
+#   python bench.py                  run, write bench_results.json, compare
+#                                    against bench_baseline.json if present
+#   python bench.py --save-baseline  run and store the result as the baseline
+#
+# a metric that is worse than the baseline by more than --tolerance fails
+# the run with exit code 1. throughput metrics are higher-is-better,
+# latency, memory and node counts lower-is-better.
+
+HIGHER_IS_BETTER = ('_per_sec', '_rate', '_per_pass', '_speedup')
+
+def quiet_import(name):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return __import__(name)
+
+def timed(fn, min_time=0.5, min_runs=3):
+    # runs fn repeatedly; returns (runs, seconds)
+    runs, start = 0, time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if runs >= min_runs and elapsed >= min_time:
+            return runs, elapsed
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+# ─── MODEL BENCHMARKS ────────────────────────
+def bench_value(lm, tokens):
+    # scalar autograd: forward graph build, backward, nodes per step
+    def forward():
+        keys = [[] for _ in range(model.n_layer)]
+        values = [[] for _ in range(model.n_layer)]
+        losses = []
+        for pos_id in range(len(tokens) - 1):
+            probs = model.softmax(lm.gpt(tokens[pos_id], pos_id, keys, values))
+            losses.append(-probs[tokens[pos_id + 1]].log())
+        return (1 / len(losses)) * sum(losses)
+
+    def step():
+        forward().backward(release=True)
+        for p in lm.params:
+            p.grad = 0
+
+    loss = forward()
+    nodes, stack, seen = 0, [loss], set()
+    while stack:
+        v = stack.pop()
+        if id(v) in seen:
+            continue
+        seen.add(id(v))
+        nodes += 1
+        stack.extend(v._children)
+
+    runs, secs = timed(forward)
+    fwd = secs / runs
+    runs, secs = timed(step)
+    return {
+        'value_forward_ms': fwd * 1000,
+        'value_backward_ms': (secs / runs - fwd) * 1000,
+        'value_train_steps_per_sec': runs / secs,
+        'value_graph_nodes_per_step': nodes,
+        'value_train_step_peak_bytes': peak_memory(step),
+    }
+
+def bench_tensor(im, tokens):
+    # tensor autograd training step from the training script, built eagerly
+    # and replayed from a compiled tape
+    def loss_fn(tokens):
+        keys = [[] for _ in range(im.n_layer)]
+        values = [[] for _ in range(im.n_layer)]
+        losses = []
+        for pos_id in range(len(tokens) - 1):
+            probs = tensor.softmax(im.gpt(tokens[pos_id], pos_id, keys, values))
+            losses.append(tensor.scale(tensor.log(tensor.pick(probs, tokens[pos_id + 1])), -1.0))
+        return tensor.mean(losses)
+
+    compiled = Compiled(loss_fn)
+    # whole-sequence pass over the same document
+    seq_len = len(tokens) - 1
+    sequence = Compiled(lambda ints, seq_len: tensor.sequence_nll(
+        im.gpt_sequence(ints[:seq_len], seq_len), ints[seq_len:], seq_len))
+    sequence_step = lambda ints: sequence(ints, seq_len)
+
+    def step(fn, ints):
+        fn(ints).backward()
+        for p in im.params:
+            p.zero_grad()
+
+    results = {}
+    variants = (('tensor', loss_fn, tokens), ('tape', compiled, tokens),
+                ('sequence', sequence_step, tokens[:-1] + tokens[1:]))
+    for name, fn, ints in variants:
+        step(fn, ints)  # trace outside the timings
+        runs, secs = timed(lambda: step(fn, ints))
+        results[f'{name}_train_steps_per_sec'] = runs / secs
+        results[f'{name}_train_step_peak_bytes'] = peak_memory(lambda: step(fn, ints))
+    return results
+
+def bench_inference(lm):
+    def decode():
+        keys = [[] for _ in range(model.n_layer)]
+        values = [[] for _ in range(model.n_layer)]
+        token_id = lm.BOS
+        for pos_id in range(model.block_size):
+            lm.engine.gpt(token_id, pos_id, keys, values)
+            token_id = pos_id % lm.BOS
+
+    runs, secs = timed(decode)
+    results = {'inference_tokens_per_sec': runs * model.block_size / secs}
+
+    random.seed(0)
+    runs, secs = timed(lambda: lm.generate_batch('', 0.5, 20))
+    results['generate_batch20_names_per_sec'] = runs * 20 / secs
+    results['generate_peak_bytes'] = peak_memory(lambda: lm.generate_batch('', 0.5, 20))
+    runs, secs = timed(lambda: lm.generate_unique('', 0.5, 20))
+    results['generate_unique20_names_per_sec'] = runs * 20 / secs
+    return results
+
+def bench_speculative(lm, names=200):
+    # n-gram drafted generation against plain generate() on as many names
+    before = lm.speculative_stats()
+    random.seed(0)
+    start = time.perf_counter()
+    for _ in range(names):
+        lm.generate_speculative('', 0.5)
+    secs = time.perf_counter() - start
+    after = lm.speculative_stats()
+
+    random.seed(0)
+    start = time.perf_counter()
+    for _ in range(names):
+        lm.generate('', 0.5)
+    plain_secs = time.perf_counter() - start
+
+    proposed = after['proposed'] - before['proposed']
+    return {
+        'speculative_names_per_sec': names / secs,
+        'speculative_acceptance_rate': (after['accepted'] - before['accepted']) / proposed,
+        'speculative_tokens_per_pass': (after['tokens'] - before['tokens']) / (after['passes'] - before['passes']),
+        'speculative_speedup': plain_secs / secs,
+    }
+
+# ─── HTTP BENCHMARKS ─────────────────────────
+def bench_http(app_module, requests_per_route=200, concurrency=8):
+    flask_app = app_module.app
+    routes = {
+        'generate': lambda c: c.get('/generate?prefix=sn&count=5&temperature=0.5'),
+        'tokenize': lambda c: c.get('/tokenize?text=snapdeal'),
+        'score': lambda c: c.post('/score', json={'texts': app_module.lm.docs[:200]}),
+    }
+    results = {}
+    for name, call in routes.items():
+        def one(_):
+            client = flask_app.test_client()
+            start = time.perf_counter()
+            response = call(client)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.status_code
+            return elapsed
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(one, range(requests_per_route)))
+        wall = time.perf_counter() - start
+        results[f'http_{name}_p50_ms'] = percentile(latencies, 50) * 1000
+        results[f'http_{name}_p99_ms'] = percentile(latencies, 99) * 1000
+        results[f'http_{name}_requests_per_sec'] = requests_per_route / wall
+    return results
+
+# ─── COMPARE ─────────────────────────────────
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results or not base:
+            continue
+        value = results[name]
+        if name.endswith(HIGHER_IS_BETTER):
+            change = (base - value) / base
+        else:
+            change = (value - base) / base
+        status = 'REGRESSION' if change > tolerance else 'ok'
+        print(f"  {name:40s} {base:14.2f} -> {value:14.2f}  {-change:+7.1%}  {status}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def run(args):
+    lm = model.get_model()
+    with contextlib.redirect_stdout(io.StringIO()):
+        lm.load()
+    im = quiet_import('implemented_microgpt')
+    with contextlib.redirect_stdout(io.StringIO()):
+        im.setup()
+    app_module = quiet_import('app')
+
+    tokens = [lm.BOS] + lm.tokenizer.encode('snapdeal') + [lm.BOS]
+    results = {}
+    results.update(bench_value(lm, tokens))
+    results.update(bench_tensor(im, tokens))
+    results.update(bench_inference(lm))
+    results.update(bench_speculative(lm))
+    results.update(bench_http(app_module, args.requests, args.concurrency))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='run the microgpt benchmark suite')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown before a metric fails')
+    parser.add_argument('--requests', type=int, default=200, help='requests per HTTP route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    results = run(args)
+    for name, value in results.items():
+        print(f"{name:40s} {value:14.2f}")
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\ncompared to {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
@@ -0,0 +1,195 @@
+import os
+import sys
+import math
+import mmap
+import json
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+# binary checkpoint format
+#
+#   magic    8 bytes   b'MGPTCKPT'
+#   version  uint32    little-endian
+#   hlen     uint32    length of the json header in bytes
+#   header   hlen bytes of utf-8 json:
+#            {"tensors": [{"name", "shape", "dtype", "offset", "nbytes"}, ...],
+#             "meta": {...}}
+#   padding  up to a 64 byte boundary
+#   data     contiguous little-endian tensors, offsets relative to here
+#
+# load() memory-maps the file and hands out memoryviews straight into the
+# mapping, so opening a checkpoint parses only the header and copies nothing.
+
+MAGIC = b'MGPTCKPT'
+VERSION = 1
+ALIGN = 64
+DTYPES = {'f64': 'd', 'f32': 'f', 'f16': 'e', 'i64': 'q', 'u16': 'H', 'i8': 'b'}
+ITEMSIZE = {name: struct.calcsize(code) for name, code in DTYPES.items()}
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+# ─── SAVE ────────────────────────────────────
+def layout(specs, meta=None):
+    # specs: [(name, shape, dtype)] -> (padded prelude bytes, header entries)
+    # entry offsets are relative to the end of the prelude
+    entries = []
+    offset = 0
+    for name, shape, dtype in specs:
+        nbytes = math.prod(shape) * ITEMSIZE[dtype]
+        entries.append({'name': name, 'shape': list(shape), 'dtype': dtype,
+                        'offset': offset, 'nbytes': nbytes})
+        offset = _align(offset + nbytes)
+
+    header = json.dumps({'tensors': entries, 'meta': meta or {}}).encode('utf-8')
+    prelude = MAGIC + struct.pack('<II', VERSION, len(header)) + header
+    prelude += b'\0' * (_align(len(prelude)) - len(prelude))
+    return prelude, entries
+
+def to_bytes(data, dtype):
+    if dtype == 'f16':
+        # array has no half floats
+        data = list(data)
+        return struct.pack(f'<{len(data)}e', *data)
+    buf = array(DTYPES[dtype], data)
+    if sys.byteorder != 'little':
+        buf.byteswap()
+    return buf.tobytes()
+
+def pack(tensors, meta=None, dtype='f64'):
+    # tensors: {name: (shape, flat list)} laid out in dict order, or
+    # {name: (shape, flat list, dtype)} to override the dtype per tensor
+    specs = [(name, t[0], t[2] if len(t) > 2 else dtype) for name, t in tensors.items()]
+    prelude, entries = layout(specs, meta)
+
+    size = entries[-1]['offset'] + entries[-1]['nbytes'] if entries else 0
+    out = bytearray(len(prelude) + size)
+    out[:len(prelude)] = prelude
+    for entry, t in zip(entries, tensors.values()):
+        start = len(prelude) + entry['offset']
+        out[start:start + entry['nbytes']] = to_bytes(t[1], entry['dtype'])
+    return out
+
+def save(filepath, tensors, meta=None, dtype='f64'):
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pack(tensors, meta, dtype))
+    os.replace(tmp_path, filepath)
+
+class AsyncSaver:
+    # writes checkpoints on a background thread. save() only copies the
+    # tensors, so the caller can keep mutating them; a save waits for the
+    # previous one, so at most one write is in flight.
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
+
+    def save(self, filepath, tensors, meta=None, dtype='f64'):
+        snapshot = {name: (t[0], list(t[1]), *t[2:]) for name, t in tensors.items()}
+        self.wait()
+        self._pending = self._executor.submit(save, filepath, snapshot, meta, dtype)
+
+    def wait(self):
+        # blocks until the last save is on disk; re-raises its error
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown()
+
+# ─── LOAD ────────────────────────────────────
+class Checkpoint:
+    def __init__(self, buf, name='<buffer>'):
+        # buf: an mmap (or any buffer) holding a packed checkpoint
+        self._mm = buf
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{name} is not a microgpt checkpoint")
+        version, hlen = struct.unpack_from('<II', buf, len(MAGIC))
+        if version > VERSION:
+            raise ValueError(f"{name} has checkpoint version {version}, expected <= {VERSION}")
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(buf[header_start:header_start + hlen]).decode('utf-8'))
+        self.version = version
+        self.meta = header['meta']
+        self.entries = {e['name']: e for e in header['tensors']}
+        self._data_start = _align(header_start + hlen)
+
+    def names(self):
+        return list(self.entries)
+
+    def shape(self, name):
+        return tuple(self.entries[name]['shape'])
+
+    def flat(self, name):
+        # 1-D view of a tensor; zero-copy on little-endian hosts (except f16)
+        e = self.entries[name]
+        start = self._data_start + e['offset']
+        raw = memoryview(self._mm).toreadonly()[start:start + e['nbytes']]
+        if e['dtype'] == 'f16':
+            # memoryview can't cast to half floats: decoded into float32
+            buf = array('f', struct.unpack(f"<{e['nbytes'] // 2}e", raw))
+            return memoryview(buf).toreadonly()
+        if sys.byteorder == 'little':
+            return raw.cast(DTYPES[e['dtype']])
+        buf = array(DTYPES[e['dtype']], raw.tobytes())
+        buf.byteswap()
+        return memoryview(buf)
+
+    def rows(self, name):
+        # one zero-copy view per row of a 2-D tensor
+        flat = self.flat(name)
+        ncols = self.shape(name)[-1]
+        return [flat[i:i + ncols] for i in range(0, len(flat), ncols)]
+
+def load(filepath):
+    with open(filepath, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Checkpoint(mm, filepath)
+
+def share(tensors, meta=None, dtype='f64'):
+    # packs tensors into an anonymous shared mapping. pages of a MAP_SHARED
+    # mapping stay shared with processes forked after this call, and the
+    # views handed out are read-only, so no worker ever copies them.
+    packed = pack(tensors, meta, dtype)
+    mm = mmap.mmap(-1, len(packed))
+    mm.write(packed)
+    return Checkpoint(mm)
+
+def is_checkpoint(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+# ─── CONVERT ─────────────────────────────────
+def convert_json(json_path, out_path, shapes, dtype='f64'):
+    # shapes: {name: (nout, nin)} in state_dict order; the json file is the
+    # flat parameter list written by the old save_model()
+    with open(json_path, 'r') as f:
+        params_data = json.load(f)
+    expected = sum(nout * nin for nout, nin in shapes.values())
+    if len(params_data) != expected:
+        raise ValueError(f"{json_path} has {len(params_data)} params, expected {expected}")
+
+    tensors = {}
+    offset = 0
+    for name, (nout, nin) in shapes.items():
+        tensors[name] = ((nout, nin), params_data[offset:offset + nout * nin])
+        offset += nout * nin
+    save(out_path, tensors, dtype=dtype)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='convert a model.json file to the binary checkpoint format')
+    parser.add_argument('json_path', nargs='?', default='model.json')
+    parser.add_argument('out_path', nargs='?', default='model.bin')
+    parser.add_argument('--dtype', choices=sorted(DTYPES), default='f64')
+    args = parser.parse_args()
+
+    import model
+    tokenizer = model.MicroGPT(args.json_path).tokenizer
+    convert_json(args.json_path, args.out_path, model.param_shapes(tokenizer.vocab_size), args.dtype)
+    model.save_metadata(model.metadata_path(args.out_path), tokenizer)
+    print(f"Converted {args.json_path} -> {args.out_path}")
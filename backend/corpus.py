@@ -0,0 +1,154 @@
+import os
+import random
+from array import array
+
+import checkpoint
+from tokenizer import Tokenizer
+
+# pre-tokenized training corpus.
+# the text file is encoded once into a flat u16 token array plus an i64
+# offsets index (doc i is tokens[offsets[i]:offsets[i+1]]), stored in the
+# checkpoint container so it can be memory-mapped. training then pulls
+# shuffled minibatches straight from the mapping with no tokenizing and no
+# per-document python strings kept around.
+
+CHUNK = 1 << 16
+
+def _lines(filepath):
+    with open(filepath) as f:
+        for line in f:
+            line = line.strip().lower()
+            if line:
+                yield line
+
+# ─── BUILD ───────────────────────────────────
+def build(input_path='input.txt', out_path='input.tok'):
+    # two streaming passes: vocab and sizes, then tokens and offsets
+    chars = set()
+    n_docs = n_tokens = 0
+    for doc in _lines(input_path):
+        chars.update(doc)
+        n_docs += 1
+        n_tokens += len(doc)
+    tokenizer = Tokenizer(sorted(chars))
+
+    prelude, entries = checkpoint.layout(
+        [('tokens', (n_tokens,), 'u16'), ('offsets', (n_docs + 1,), 'i64')],
+        meta={'chars': tokenizer.chars, 'source': os.path.basename(input_path)},
+    )
+    tokens_entry, offsets_entry = entries
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(prelude)
+        f.truncate(len(prelude) + offsets_entry['offset'] + offsets_entry['nbytes'])
+
+        tokens = array('H')
+        offsets = array('q', [0])
+        tok_pos = len(prelude) + tokens_entry['offset']
+        off_pos = len(prelude) + offsets_entry['offset']
+        total = 0
+        for doc in _lines(input_path):
+            tokens.extend(tokenizer.encode(doc))
+            total += len(doc)
+            offsets.append(total)
+            if len(tokens) >= CHUNK:
+                tok_pos = _flush(f, tok_pos, tokens, 'u16')
+            if len(offsets) >= CHUNK:
+                off_pos = _flush(f, off_pos, offsets, 'i64')
+        _flush(f, tok_pos, tokens, 'u16')
+        _flush(f, off_pos, offsets, 'i64')
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def _flush(f, pos, buf, dtype):
+    f.seek(pos)
+    data = checkpoint.to_bytes(buf, dtype)
+    f.write(data)
+    del buf[:]
+    return pos + len(data)
+
+def ensure(input_path='input.txt', out_path='input.tok'):
+    # rebuilds the token file when it is missing or older than the text
+    if not os.path.exists(out_path) or os.path.getmtime(out_path) < os.path.getmtime(input_path):
+        build(input_path, out_path)
+    return Corpus(out_path)
+
+# ─── LOAD ────────────────────────────────────
+class Corpus:
+    def __init__(self, filepath):
+        ckpt = checkpoint.load(filepath)
+        self.tokens = ckpt.flat('tokens')
+        self.offsets = ckpt.flat('offsets')
+        self.tokenizer = Tokenizer(ckpt.meta['chars'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def doc(self, i):
+        # zero-copy view of document i's token ids
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def batches(self, batch_size=1, seed=None, rng=None):
+        # endless stream of minibatches, reshuffled every epoch. each item is
+        # a list of token sequences wrapped in BOS on both sides.
+        return Loader(self, batch_size, rng or random.Random(seed))
+
+# ─── LOADER ──────────────────────────────────
+class Loader:
+    # the iterator behind Corpus.batches(). every epoch visits the docs in a
+    # fresh permutation: an index array (one int per doc; the tokens stay
+    # memory-mapped) shuffled by a Random seeded from rng. its position is
+    # that seed and an index, so it can be saved with a training checkpoint
+    # and restored to continue the exact same sequence of batches (given the
+    # same rng state).
+    def __init__(self, corpus, batch_size, rng):
+        if len(corpus) == 0:
+            raise ValueError('corpus has no documents to draw batches from')
+        self.corpus = corpus
+        self.batch_size = batch_size
+        self.rng = rng
+        self.seed = None   # shuffle seed of the current epoch, None before the first
+        self.index = 0     # next position in the current epoch
+        self.perm = None
+
+    def __iter__(self):
+        return self
+
+    def _shuffle(self):
+        perm = array('q', range(len(self.corpus)))
+        random.Random(self.seed).shuffle(perm)
+        return perm
+
+    def __next__(self):
+        corpus, n = self.corpus, len(self.corpus)
+        BOS = corpus.tokenizer.BOS
+        batch = []
+        while len(batch) < self.batch_size:
+            if self.seed is None or self.index >= n:
+                self.seed = self.rng.getrandbits(64)
+                self.perm = self._shuffle()
+                self.index = 0
+            i = self.perm[self.index]
+            self.index += 1
+            batch.append([BOS, *corpus.doc(i), BOS])
+        return batch
+
+    def state(self):
+        return {'seed': self.seed, 'index': self.index}
+
+    def restore(self, state):
+        self.seed, self.index = state['seed'], state['index']
+        self.perm = self._shuffle() if self.seed is not None else None
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='pre-tokenize a text corpus, one document per line')
+    parser.add_argument('input_path', nargs='?', default='input.txt')
+    parser.add_argument('out_path', nargs='?', default='input.tok')
+    args = parser.parse_args()
+
+    build(args.input_path, args.out_path)
+    corpus = Corpus(args.out_path)
+    print(f"{len(corpus)} docs, {len(corpus.tokens)} tokens -> {args.out_path}")
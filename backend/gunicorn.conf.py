@@ -0,0 +1,23 @@
+import gc
+import os
+
+# gunicorn reads this file automatically (see Procfile).
+#
+# with SHARED_WEIGHTS=1 the app, and with it model.py, is imported once in
+# the master before forking. the weights live in a read-only mmap segment
+# whose pages every worker shares, so adding workers does not add copies.
+preload_app = os.environ.get('SHARED_WEIGHTS') == '1'
+
+def pre_fork(server, worker):
+    # move everything the master allocated into the permanent generation so
+    # the cyclic gc in workers never writes to (and un-shares) those pages
+    if preload_app:
+        import app
+        app.lm.load()  # in the master, so the workers inherit the pages
+        gc.freeze()
+
+def post_worker_init(worker):
+    # the app is imported by now; without preloading each worker loads its
+    # own weights in the background and answers /ready with 503 meanwhile
+    import app
+    app.lm.start_loading()
@@ -1,74 +1,19 @@
-import os 
-import math
+import os
+import json
 import random
-from webbrowser import get
-random.seed(40)
+import argparse
+import numpy as np
 
-# step 1 - checking the file exists
-if os.path.exists("input.txt"):
-    print("File exists, loading the dataset...")
-else:
-    print("File does not exist, please check the file path and try again.")
-    exit()
-
-# step 2 - loading the dataset
-docs = [line.strip().lower() for line in open("input.txt") if line.strip()]
-random.shuffle(docs)  # prevent catastrophic forgetting
-print(f'num docs: {len(docs)}')
-
-# step 3 - creating the vocabulary
-unique_chars = sorted(set(''.join(docs)))
-BOS = len(unique_chars)
-print(f'unique chars: {unique_chars}')
-vocab_size = len(unique_chars) + 1
-print(f'vocab size: {vocab_size}')
-
-# Value class - autograd engine
-class Value:
-    def __init__(self, data, children=(), local_grad=()):
-        self.data = data
-        self.grad = 0
-        self._children = children
-        self._local_grad = local_grad
-
-    def __add__(self, other):
-        other = other if isinstance(other, Value) else Value(other)
-        return Value(self.data + other.data, (self, other), (1, 1))
-    
-    def __mul__(self, other):
-        other = other if isinstance(other, Value) else Value(other)
-        return Value(self.data * other.data, (self, other), (other.data, self.data))
-
-    def backward(self):
-        topo = []
-        visited = set()
-        def build_topo(v):
-            if v not in visited:
-                visited.add(v)
-                for child in v._children:
-                    build_topo(child)
-                topo.append(v)
-        build_topo(self)
-        self.grad = 1
-        for v in reversed(topo):
-            for child, local_grad in zip(v._children, v._local_grad):
-                child.grad += local_grad * v.grad
-
-    def __pow__(self, other):
-        return Value(self.data**other, (self,), (other * self.data**(other-1),))
-    def log(self):
-        return Value(math.log(self.data), (self,), (1/self.data,))
-    def exp(self):
-        return Value(math.exp(self.data), (self,), (math.exp(self.data),))
-    def relu(self):
-        return Value(max(0, self.data), (self,), (float(self.data > 0),))
-    def __neg__(self): return self * -1
-    def __radd__(self, other): return self + other
-    def __sub__(self, other): return self + (-other)
-    def __rsub__(self, other): return other + (-self)
-    def __rmul__(self, other): return self * other
-    def __truediv__(self, other): return self * other**-1
-    def __rtruediv__(self, other): return other * self**-1
+import corpus
+import checkpoint
+import model  # vocab sidecar helpers
+from tape import Compiled
+from parallel import DataParallel, compute_grads
+
+# autograd engine - tensor ops from tensor.py
+# (model.Value is the scalar reference these ops are gradient-checked against)
+from tensor import Tensor, embed, add, scale, linear, rmsnorm, softmax, relu, attention
+from tensor import embed_rows, causal_attention, sequence_nll
 
 # model hyperparameters
 n_layer = 1
@@ -76,50 +21,62 @@ n_embd = 16
 block_size = 16
 n_head = 4
 head_dim = n_embd // n_head
-matrix = lambda nout, nin, std=0.08: [[Value(random.gauss(0, std)) for _ in range(nin)] for _ in range(nout)]
-
-# model parameters
-state_dict = {
-    'wte': matrix(vocab_size, n_embd),
-    'wpe': matrix(block_size, n_embd),
-    'lm_head': matrix(vocab_size, n_embd)
-}
-for i in range(n_layer):
-    state_dict[f'layer{i}.attn_wq'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wk'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wv'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wo'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.mlp_fc1'] = matrix(4 * n_embd, n_embd)
-    state_dict[f'layer{i}.mlp_fc2'] = matrix(n_embd, 4 * n_embd)
-
-# helper functions
-def rmsnorm(x):
-    ms = sum(xi * xi for xi in x) / len(x)
-    scale = (ms + 1e-5) ** -0.5
-    return [xi * scale for xi in x]
-
-def softmax(logits):
-    max_val = max(val.data for val in logits)
-    exps = [(val - max_val).exp() for val in logits]
-    total = sum(exps)
-    return [e / total for e in exps]
-
-def linear(x, w):
-    output = []
-    for wo in w:
-        row_sum = 0
-        for wi, xi in zip(wo, x):
-            row_sum = row_sum + wi * xi
-        output.append(row_sum)
-    return output
+matrix = lambda nout, nin, std=0.08: Tensor([random.gauss(0, std) for _ in range(nout * nin)], (nout, nin))
+
+# dataset, vocabulary and parameters, filled in by setup()
+dataset = tokenizer = unique_chars = BOS = vocab_size = None
+state_dict = {}
+params = []
+
+def setup(input_path="input.txt", seed=40):
+    # loads the dataset and builds freshly initialized parameters for gpt(),
+    # gpt_sequence() and generate(). seeds the global random, which the
+    # weight init and the training loop's batch order both draw from.
+    global dataset, tokenizer, unique_chars, BOS, vocab_size, params
+    random.seed(seed)
+
+    # step 1 - checking the file exists
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"{input_path} does not exist, please check the file path and try again.")
+    print("File exists, loading the dataset...")
+
+    # step 2 - loading the dataset
+    # encoded once into input.tok (flat token array + offsets), memory-mapped
+    dataset = corpus.ensure(input_path, os.path.splitext(input_path)[0] + ".tok")
+    print(f'num docs: {len(dataset)}')
+
+    # step 3 - creating the vocabulary
+    tokenizer = dataset.tokenizer
+    unique_chars = tokenizer.chars
+    BOS = tokenizer.BOS
+    print(f'unique chars: {unique_chars}')
+    vocab_size = tokenizer.vocab_size
+    print(f'vocab size: {vocab_size}')
+
+    # model parameters
+    state_dict.clear()
+    state_dict['wte'] = matrix(vocab_size, n_embd)
+    state_dict['wpe'] = matrix(block_size, n_embd)
+    state_dict['lm_head'] = matrix(vocab_size, n_embd)
+    for i in range(n_layer):
+        state_dict[f'layer{i}.attn_wq'] = matrix(n_embd, n_embd)
+        state_dict[f'layer{i}.attn_wk'] = matrix(n_embd, n_embd)
+        state_dict[f'layer{i}.attn_wv'] = matrix(n_embd, n_embd)
+        state_dict[f'layer{i}.attn_wo'] = matrix(n_embd, n_embd)
+        state_dict[f'layer{i}.mlp_fc1'] = matrix(4 * n_embd, n_embd)
+        state_dict[f'layer{i}.mlp_fc2'] = matrix(n_embd, 4 * n_embd)
+
+    # every parameter matrix is one tensor
+    params = list(state_dict.values())
+    print(f'num params: {sum(p.data.size for p in params)}')
 
 # gpt function - the full forward pass
 def gpt(token_id, pos_id, keys, values):
     
     # step 1 - get token and position embeddings
-    tok_emb = state_dict['wte'][token_id]
-    pos_emb = state_dict['wpe'][pos_id]
-    x = [t + p for t, p in zip(tok_emb, pos_emb)]
+    tok_emb = embed(state_dict['wte'], token_id)
+    pos_emb = embed(state_dict['wpe'], pos_id)
+    x = add(tok_emb, pos_emb)
     x = rmsnorm(x)
 
     # step 2 - transformer layers
@@ -138,149 +95,68 @@ def gpt(token_id, pos_id, keys, values):
         keys[li].append(k)
         values[li].append(v)
 
-        # multi head attention
-        x_attn = []
-        for h in range(n_head):
-            
-            # slice for this head
-            start = h * head_dim
-            end = start + head_dim
-            q_h = q[start:end]
-            k_h = [ki[start:end] for ki in keys[li]]
-            v_h = [vi[start:end] for vi in values[li]]
-
-            # step 1 - attention scores
-            attn_scores = []
-            for t in range(len(k_h)):
-                score = 0
-                for j in range(head_dim):
-                    score = score + q_h[j] * k_h[t][j]
-                score = score / head_dim**0.5
-                attn_scores.append(score)
-
-            # step 2 - softmax → probabilities
-            attn_weights = softmax(attn_scores)
-
-            # step 3 - weighted sum of values
-            head_output = []
-            for j in range(head_dim):
-                weighted_sum = 0
-                for t in range(len(v_h)):
-                    weighted_sum = weighted_sum + attn_weights[t] * v_h[t][j]
-                head_output.append(weighted_sum)
-
-            x_attn.extend(head_output)
+        # multi head attention - scores, softmax and weighted sum of values
+        # for every head in one causal attention op
+        x_attn = attention(q, keys[li], values[li], n_head)
 
         # project attention output
         x = linear(x_attn, state_dict[f'layer{li}.attn_wo'])
 
         # residual connection
-        x = [a + b for a, b in zip(x, x_residual)]
+        x = add(x, x_residual)
         # MLP block
         x_residual = x          # save again for residual
         x = rmsnorm(x)          # normalize before MLP
 
         # expand → activate → compress
         x = linear(x, state_dict[f'layer{li}.mlp_fc1'])  # expand 16 → 64
-        x = [xi.relu() for xi in x]                       # activation
+        x = relu(x)                                       # activation
         x = linear(x, state_dict[f'layer{li}.mlp_fc2'])  # compress 64 → 16
 
         # residual connection again
-        x = [a + b for a, b in zip(x, x_residual)]
+        x = add(x, x_residual)
 
     # step 3 - output logits
     logits = linear(x, state_dict['lm_head'])
     return logits
 
+# whole-sequence forward pass for training - same model as gpt(), but every
+# position of every sequence goes through each op at once as one row of a
+# (n_seq * seq_len, n_embd) tensor. causal attention stands in for the
+# growing kv cache: position t only sees positions <= t of its own sequence.
+def gpt_sequence(token_ids, seq_len):
+    n_seq = len(token_ids) // seq_len
+    tok_emb = embed_rows(state_dict['wte'], token_ids)
+    pos_emb = embed_rows(state_dict['wpe'], list(range(seq_len)) * n_seq)
+    x = add(tok_emb, pos_emb)
+    x = rmsnorm(x)
+
+    for li in range(n_layer):
+        x_residual = x
+        x = rmsnorm(x)
+        q = linear(x, state_dict[f'layer{li}.attn_wq'])
+        k = linear(x, state_dict[f'layer{li}.attn_wk'])
+        v = linear(x, state_dict[f'layer{li}.attn_wv'])
+        x_attn = causal_attention(q, k, v, n_head, seq_len)
+        x = linear(x_attn, state_dict[f'layer{li}.attn_wo'])
+        x = add(x, x_residual)
+
+        x_residual = x
+        x = rmsnorm(x)
+        x = linear(x, state_dict[f'layer{li}.mlp_fc1'])
+        x = relu(x)
+        x = linear(x, state_dict[f'layer{li}.mlp_fc2'])
+        x = add(x, x_residual)
+
+    return linear(x, state_dict['lm_head'])
+
 # training parameters
 learning_rate = 0.01
 beta1 = 0.85
 beta2 = 0.99
 eps_adam = 1e-8
-num_steps = 1000
-
-# flatten all parameters into one list
-params = [p for mat in state_dict.values() for row in mat for p in row]
-print(f'num params: {len(params)}')
-
-# adam optimizer buffers
-m = [0.0] * len(params)  # first moment
-v = [0.0] * len(params)  # second moment
-
-# training loop
-loss_history = []  # track loss for plotting
-
-# load model if exists, skip training
-if os.path.exists('model.json'):
-    import json
-    print("Loading saved model...")
-    with open('model.json', 'r') as f:
-        params_data = json.load(f)
-    for p, d in zip(params, params_data):
-        p.data = d
-    print("Model loaded! Skipping training.")
-else:
-    print("No saved model found, training from scratch...")
-
-    for step in range(num_steps):
-
-        # pick one document
-        doc = docs[step % len(docs)]
-        
-        # tokenize it
-        tokens = [BOS] + [unique_chars.index(ch) for ch in doc] + [BOS]
-        n = min(block_size, len(tokens) - 1)
-
-        # forward pass
-        keys = [[] for _ in range(n_layer)]
-        values = [[] for _ in range(n_layer)]
-        losses = []
-        
-        for pos_id in range(n):
-            token_id = tokens[pos_id]
-            target_id = tokens[pos_id + 1]
-            
-            # get predictions
-            logits = gpt(token_id, pos_id, keys, values)
-            
-            # turn into probabilities
-            probs = softmax(logits)
-            
-            # calculate loss
-            loss_t = -probs[target_id].log()
-            losses.append(loss_t)
-        
-        # average loss
-        loss = (1 / n) * sum(losses)
-        loss_history.append(loss.data)
-
-        # backward pass
-        loss.backward()
-
-        # adam optimizer update
-        lr_t = learning_rate * (1 - step / num_steps)
-        for i, p in enumerate(params):
-            m[i] = beta1 * m[i] + (1 - beta1) * p.grad
-            v[i] = beta2 * v[i] + (1 - beta2) * p.grad ** 2
-            m_hat = m[i] / (1 - beta1 ** (step + 1))
-            v_hat = v[i] / (1 - beta2 ** (step + 1))
-            p.data -= lr_t * m_hat / (v_hat ** 0.5 + eps_adam)
-            p.grad = 0  # zero gradients
-
-        print(f"step {step+1:4d} / {num_steps} | loss {loss.data:.4f}", end='\r')
-
-    print("\nTraining complete!")
-
-    # save model
-    import json
-    params_data = [p.data for p in params]
-    with open('model.json', 'w') as f:
-        json.dump(params_data, f)
-    print("Model saved to model.json!")
 
 # inference - generate new startup names
-temperature = 0.5
-print("\n--- Generated Startup Names ---")
 def generate(prefix="", temperature=0.5):
     keys = [[] for _ in range(n_layer)]
     values = [[] for _ in range(n_layer)]
@@ -289,10 +165,10 @@ def generate(prefix="", temperature=0.5):
     # if prefix given, feed it in first
     if prefix:
         for pos_id, ch in enumerate(prefix):
-            if ch not in unique_chars:
+            if ch not in tokenizer:
                 print(f"Character '{ch}' not in vocabulary!")
                 return
-            token_id = unique_chars.index(ch)
+            token_id = tokenizer.stoi[ch]
             gpt(token_id, pos_id, keys, values)
             sample.append(ch)
         start_pos = len(prefix)
@@ -300,29 +176,196 @@ def generate(prefix="", temperature=0.5):
         start_pos = 0
     
     # now generate rest
-    token_id = BOS if not prefix else unique_chars.index(prefix[-1])
+    token_id = BOS if not prefix else tokenizer.stoi[prefix[-1]]
     for pos_id in range(start_pos, block_size):
         logits = gpt(token_id, pos_id, keys, values)
-        probs = softmax([l / temperature for l in logits])
+        probs = softmax(scale(logits, 1 / temperature))
         token_id = random.choices(
             range(vocab_size),
-            weights=[p.data for p in probs]
+            weights=probs.data
         )[0]
         if token_id == BOS:
             break
-        sample.append(unique_chars[token_id])
+        sample.append(tokenizer.itos[token_id])
     
     return ''.join(sample)
 
-
-print("\n--- Generated Startup Names ---")
-for sample_idx in range(10):
-    print(f"sample {sample_idx+1}: {generate('', temperature)}")
-
-# test generate() with prefixes
-print("\n--- Testing with prefix ---")
-print(generate("snap"))
-print(generate("zep"))
-print(generate("cred"))
-print(generate(""))  # random
-    
\ No newline at end of file
+# training and sampling only run as a script; importing this module (as
+# bench.py does) has no side effects until setup() is called
+def main(parser):
+    args, _ = parser.parse_known_args()
+    setup()
+    num_steps = args.steps
+    batch_size = args.batch_size   # documents per step
+    num_workers = args.workers     # data-parallel processes
+
+    # adam optimizer buffers, one array per parameter tensor
+    m = [np.zeros(p.shape) for p in params]  # first moment
+    v = [np.zeros(p.shape) for p in params]  # second moment
+
+    # training loop
+    loss_history = []  # track loss for plotting
+
+    # load model if exists, skip training
+    resume = args.resume and os.path.exists(args.checkpoint)
+    if args.resume and not resume:
+        print(f"No training checkpoint at {args.checkpoint}, starting a new run")
+    if not resume and os.path.exists('model.bin'):
+        print("Loading saved model...")
+        ckpt = checkpoint.load('model.bin')
+        for name, p in state_dict.items():
+            p.data = np.array(ckpt.flat(name), dtype=np.float64).reshape(p.shape)
+        if not os.path.exists(model.metadata_path('model.bin')):
+            model.save_metadata(model.metadata_path('model.bin'), tokenizer)
+        print("Model loaded! Skipping training.")
+    elif not resume and os.path.exists('model.json'):
+        print("Loading saved model (legacy json)...")
+        with open('model.json', 'r') as f:
+            params_data = json.load(f)
+        offset = 0
+        for p in params:
+            p.data = np.array(params_data[offset:offset + p.data.size]).reshape(p.shape)
+            offset += p.data.size
+        print("Model loaded! Skipping training.")
+    else:
+        if not resume:
+            print("No saved model found, training from scratch...")
+
+        # loss of a minibatch: the mean loss of each document, summed.
+        # documents are cut to block_size + 1 tokens and padded to the longest
+        # one; padded positions get target -1 and are left out of the loss.
+        def pad_batch(batch):
+            seq_len = min(block_size, max(len(tokens) for tokens in batch) - 1)
+            token_ids, targets = [], []
+            for tokens in batch:
+                tokens = tokens[:seq_len + 1]
+                pad = seq_len + 1 - len(tokens)
+                token_ids += tokens[:-1] + [BOS] * pad
+                targets += tokens[1:] + [-1] * pad
+            return token_ids, targets, seq_len
+
+        def sequence_loss(ints, n_seq, seq_len):
+            n = n_seq * seq_len
+            logits = gpt_sequence(ints[:n], seq_len)
+            return sequence_nll(logits, ints[n:], seq_len)
+
+        # the graph only depends on the batch shape, so each shape is traced
+        # once and replayed from a flat tape (see tape.py)
+        compiled_loss = Compiled(sequence_loss)
+        def train_loss(batch):
+            token_ids, targets, seq_len = pad_batch(batch)
+            return compiled_loss(token_ids + targets, len(batch), seq_len)
+
+        # shuffled minibatches of already tokenized documents
+        # (shuffling prevents catastrophic forgetting)
+        batches = dataset.batches(batch_size, rng=random)
+
+        # full training state: weights, adam buffers, step, rng and loader
+        # position. restoring it continues the run exactly where it stopped.
+        def train_state(step):
+            tensors = {}
+            for name, p in state_dict.items():
+                tensors[name] = (p.shape, p.data.ravel())
+            for prefix, buffers in (('adam_m', m), ('adam_v', v)):
+                for name, p, buf in zip(state_dict, params, buffers):
+                    tensors[f'{prefix}.{name}'] = (p.shape, buf.ravel())
+            # one float per step, so it goes in the tensor data, not the json header
+            tensors['loss_history'] = ((len(loss_history),), loss_history)
+            meta = {'step': step, 'num_steps': num_steps, 'batch_size': batch_size,
+                    'rng': random.getstate(), 'loader': batches.state()}
+            return tensors, meta
+
+        start_step = 0
+        if resume:
+            ckpt = checkpoint.load(args.checkpoint)
+            meta = ckpt.meta
+            if (meta['num_steps'], meta['batch_size']) != (num_steps, batch_size):
+                parser.error(f"{args.checkpoint} was saved with --steps {meta['num_steps']} "
+                             f"--batch-size {meta['batch_size']}")
+            for name, p, m_p, v_p in zip(state_dict, params, m, v):
+                p.data = np.array(ckpt.flat(name)).reshape(p.shape)
+                m_p[...] = np.array(ckpt.flat(f'adam_m.{name}')).reshape(p.shape)
+                v_p[...] = np.array(ckpt.flat(f'adam_v.{name}')).reshape(p.shape)
+            version, internal, gauss_next = meta['rng']
+            random.setstate((version, tuple(internal), gauss_next))
+            batches.restore(meta['loader'])
+            loss_history[:] = ckpt.flat('loss_history')
+            start_step = meta['step']
+            print(f"Resuming from {args.checkpoint} at step {start_step}")
+
+        # checkpoints are written on a background thread
+        saver = checkpoint.AsyncSaver()
+
+        # with --workers > 1 each minibatch is sharded across processes and
+        # their gradients are summed in shared memory
+        trainer = DataParallel(params, train_loss, num_workers) if num_workers > 1 else None
+
+        for step in range(start_step, num_steps):
+
+            # pick the next minibatch, each doc as [BOS, ...tokens, BOS]
+            batch = next(batches)
+
+            # forward + backward pass, summed over the batch
+            if trainer:
+                loss_sum = trainer.grads_for(batch)
+            else:
+                loss_sum = compute_grads(train_loss, batch)
+            loss = loss_sum / len(batch)
+            loss_history.append(loss)
+            grad_scale = 1 / len(batch)  # mean over documents
+
+            # adam optimizer update
+            lr_t = learning_rate * (1 - step / num_steps)
+            bias1 = 1 - beta1 ** (step + 1)
+            bias2 = 1 - beta2 ** (step + 1)
+            for p, m_p, v_p in zip(params, m, v):
+                g = p.grad * grad_scale
+                m_p *= beta1
+                m_p += (1 - beta1) * g
+                v_p *= beta2
+                v_p += (1 - beta2) * g ** 2
+                m_hat = m_p / bias1
+                v_hat = v_p / bias2
+                p.data -= lr_t * m_hat / (v_hat ** 0.5 + eps_adam)
+                p.zero_grad()  # zero gradients
+
+            print(f"step {step+1:4d} / {num_steps} | loss {loss:.4f}", end='\r')
+
+            if args.save_every and (step + 1) % args.save_every == 0 and step + 1 < num_steps:
+                saver.save(args.checkpoint, *train_state(step + 1))
+
+        if trainer:
+            trainer.close()
+        saver.save(args.checkpoint, *train_state(num_steps))
+        saver.close()
+        print("\nTraining complete!")
+
+        # save model
+        checkpoint.save('model.bin', {name: (p.shape, p.data.ravel()) for name, p in state_dict.items()})
+        # vocab and hyperparameters for the API, which never reads input.txt
+        model.save_metadata(model.metadata_path('model.bin'), tokenizer)
+        print("Model saved to model.bin!")
+
+    temperature = 0.5
+    print("\n--- Generated Startup Names ---")
+    for sample_idx in range(10):
+        print(f"sample {sample_idx+1}: {generate('', temperature)}")
+
+    # test generate() with prefixes
+    print("\n--- Testing with prefix ---")
+    print(generate("snap"))
+    print(generate("zep"))
+    print(generate("cred"))
+    print(generate(""))  # random
+
+
+if __name__ == '__main__':
+    # command line options
+    parser = argparse.ArgumentParser(description='train microgpt on input.txt')
+    parser.add_argument('--workers', type=int, default=1, help='processes to shard each minibatch across')
+    parser.add_argument('--batch-size', type=int, default=1, help='documents per step')
+    parser.add_argument('--steps', type=int, default=1000, help='training steps')
+    parser.add_argument('--checkpoint', default='train.ckpt', help='training state file (weights, adam buffers, step, rng)')
+    parser.add_argument('--save-every', type=int, default=100, help='steps between training checkpoints, 0 to disable')
+    parser.add_argument('--resume', action='store_true', help='continue the run saved in --checkpoint')
+    main(parser)
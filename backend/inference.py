@@ -0,0 +1,195 @@
+import math
+from operator import mul
+
+# graph-free forward pass for serving.
+# same math as model.gpt(), but on plain python floats, so no Value nodes
+# are allocated and nothing has to be thrown away after sampling.
+#
+# the operation order mirrors the Value path exactly (including a / b being
+# computed as a * b**-1), so for a fixed seed both paths sample the same tokens.
+# weights may also be Int8Matrix (see quantize.py), which trades that
+# exactness for an eighth of the f64 size.
+
+# ─── HELPER FUNCTIONS ────────────────────────
+def rmsnorm(x):
+    ms = 0
+    for xi in x:
+        ms = ms + xi * xi
+    ms = ms * len(x) ** -1
+    scale = (ms + 1e-5) ** -0.5
+    return [xi * scale for xi in x]
+
+def softmax(logits):
+    max_val = max(logits)
+    exps = [math.exp(val - max_val) for val in logits]
+    total = 0
+    for e in exps:
+        total = total + e
+    inv_total = total ** -1
+    return [e * inv_total for e in exps]
+
+def log_softmax(logits):
+    max_val = max(logits)
+    log_total = math.log(sum([math.exp(val - max_val) for val in logits])) + max_val
+    return [val - log_total for val in logits]
+
+def linear(x, w):
+    if isinstance(w, Int8Matrix):
+        return w.linear(x)
+    output = []
+    for wo in w:
+        row_sum = 0
+        for wi, xi in zip(wo, x):
+            row_sum = row_sum + wi * xi
+        output.append(row_sum)
+    return output
+
+def linear_block(xs, w):
+    # linear() of several inputs, with the dot products done by sum(map())
+    if isinstance(w, Int8Matrix):
+        return [w.linear(x) for x in xs]
+    return [[sum(map(mul, wo, x)) for wo in w] for x in xs]
+
+# ─── INT8 WEIGHTS ────────────────────────────
+# per-row int8 quantization: row i is stored as ints q with one float
+# scale s_i and stands for q * s_i. linear() multiplies by the ints and
+# applies the scale once per output, so the weights are never expanded.
+class Int8Matrix:
+    def __init__(self, rows, scales):
+        self.rows = rows      # int8 rows (e.g. memoryviews into a checkpoint)
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        # dequantized row, for embedding lookups
+        s = self.scales[i]
+        return [q * s for q in self.rows[i]]
+
+    def linear(self, x):
+        return [sum(map(mul, row, x)) * s for row, s in zip(self.rows, self.scales)]
+
+# ─── WEIGHTS ─────────────────────────────────
+def export_weights(state_dict):
+    # snapshot Value parameters as nested lists of floats
+    return {name: [[p.data for p in row] for row in mat] for name, mat in state_dict.items()}
+
+# ─── FLOAT GPT ───────────────────────────────
+class FloatGPT:
+    def __init__(self, weights, n_layer, n_head):
+        self.weights = weights
+        self.n_layer = n_layer
+        self.n_head = n_head
+        self.n_embd = len(weights['wte'][0])
+        self.head_dim = self.n_embd // n_head
+        self.attn_scale = (self.head_dim ** 0.5) ** -1
+
+    def gpt(self, token_id, pos_id, keys, values, recorder=None):
+        # recorder: optional introspect.Recorder that receives the
+        # embeddings and attention weights of this position
+        w = self.weights
+        head_dim = self.head_dim
+
+        tok_emb = w['wte'][token_id]
+        pos_emb = w['wpe'][pos_id]
+        if recorder is not None:
+            recorder.embeddings(pos_id, tok_emb, pos_emb)
+        x = [t + p for t, p in zip(tok_emb, pos_emb)]
+        x = rmsnorm(x)
+
+        for li in range(self.n_layer):
+            x_residual = x
+            x = rmsnorm(x)
+            q = linear(x, w[f'layer{li}.attn_wq'])
+            k = linear(x, w[f'layer{li}.attn_wk'])
+            v = linear(x, w[f'layer{li}.attn_wv'])
+            keys[li].append(k)
+            values[li].append(v)
+
+            x_attn = []
+            for h in range(self.n_head):
+                start = h * head_dim
+                end = start + head_dim
+                q_h = q[start:end]
+
+                attn_scores = []
+                for ki in keys[li]:
+                    score = 0
+                    for qj, kj in zip(q_h, ki[start:end]):
+                        score = score + qj * kj
+                    attn_scores.append(score * self.attn_scale)
+
+                attn_weights = softmax(attn_scores)
+                if recorder is not None:
+                    recorder.attention(li, h, pos_id, attn_weights)
+
+                for j in range(start, end):
+                    weighted_sum = 0
+                    for a, vi in zip(attn_weights, values[li]):
+                        weighted_sum = weighted_sum + a * vi[j]
+                    x_attn.append(weighted_sum)
+
+            x = linear(x_attn, w[f'layer{li}.attn_wo'])
+            x = [a + b for a, b in zip(x, x_residual)]
+
+            x_residual = x
+            x = rmsnorm(x)
+            x = linear(x, w[f'layer{li}.mlp_fc1'])
+            x = [max(0, xi) for xi in x]
+            x = linear(x, w[f'layer{li}.mlp_fc2'])
+            x = [a + b for a, b in zip(x, x_residual)]
+
+        logits = linear(x, w['lm_head'])
+        return logits
+
+    def gpt_block(self, token_ids, start_pos, keys, values):
+        # consecutive positions start_pos, start_pos + 1, ... in one pass,
+        # e.g. to check several draft tokens at once; each layer's matmuls run
+        # for all of them together. position i attends to
+        # the cache plus token_ids[:i + 1]; the logits of every position are
+        # those of calling gpt() on the tokens one by one (bit for bit as long
+        # as sum() adds floats left to right, i.e. before python 3.12).
+        w = self.weights
+        head_dim = self.head_dim
+
+        xs = [rmsnorm([t + p for t, p in zip(w['wte'][token_id], w['wpe'][start_pos + i])])
+              for i, token_id in enumerate(token_ids)]
+
+        for li in range(self.n_layer):
+            xs_residual = xs
+            xs = [rmsnorm(x) for x in xs]
+            qs = linear_block(xs, w[f'layer{li}.attn_wq'])
+            keys[li].extend(linear_block(xs, w[f'layer{li}.attn_wk']))
+            values[li].extend(linear_block(xs, w[f'layer{li}.attn_wv']))
+            past = len(keys[li]) - len(xs)
+
+            xs_attn = []
+            for i, q in enumerate(qs):
+                visible_keys = keys[li][:past + i + 1]
+                visible_values = values[li][:past + i + 1]
+                x_attn = []
+                for h in range(self.n_head):
+                    start = h * head_dim
+                    end = start + head_dim
+                    q_h = q[start:end]
+                    attn_weights = softmax([sum(map(mul, q_h, ki[start:end])) * self.attn_scale
+                                            for ki in visible_keys])
+                    for j in range(start, end):
+                        x_attn.append(sum([a * vi[j] for a, vi in zip(attn_weights, visible_values)]))
+                xs_attn.append(x_attn)
+
+            xs = linear_block(xs_attn, w[f'layer{li}.attn_wo'])
+            xs = [[a + b for a, b in zip(x, r)] for x, r in zip(xs, xs_residual)]
+
+            xs_residual = xs
+            xs = linear_block([rmsnorm(x) for x in xs], w[f'layer{li}.mlp_fc1'])
+            xs = [[max(0, xi) for xi in x] for x in xs]
+            xs = linear_block(xs, w[f'layer{li}.mlp_fc2'])
+            xs = [[a + b for a, b in zip(x, r)] for x, r in zip(xs, xs_residual)]
+
+        return linear_block(xs, w['lm_head'])
+
+    def probs(self, logits, temperature):
+        inv_temp = temperature ** -1
+        return softmax([l * inv_temp for l in logits])
@@ -0,0 +1,69 @@
+import sys
+import base64
+from array import array
+
+# forward pass introspection.
+# FloatGPT.gpt(..., recorder=r) copies what it computes for the UI into r:
+# the token and position embedding of every position and the attention
+# weights of every layer and head. the buffers are float32 arrays allocated
+# once per recorder; without a recorder gpt() only pays two None checks.
+#
+# arrays leave the server as {"shape": [...], "dtype": "f32", "data": <base64
+# of little-endian float32>}, which the browser can wrap in a Float32Array.
+
+def encode(values, shape):
+    buf = values if isinstance(values, array) and values.typecode == 'f' else array('f', values)
+    if sys.byteorder != 'little':
+        buf = array('f', buf)
+        buf.byteswap()
+    return {'shape': list(shape), 'dtype': 'f32', 'data': base64.b64encode(buf.tobytes()).decode('ascii')}
+
+# ─── RECORDER ────────────────────────────────
+class Recorder:
+    def __init__(self, n_layer, n_head, n_embd, block_size):
+        self.n_layer = n_layer
+        self.n_head = n_head
+        self.n_embd = n_embd
+        self.block_size = block_size
+        self.tok_emb = array('f', bytes(4 * block_size * n_embd))
+        self.pos_emb = array('f', bytes(4 * block_size * n_embd))
+        # attention[layer][head][query pos][key pos]; row p has p + 1 weights
+        self.attn = array('f', bytes(4 * n_layer * n_head * block_size * block_size))
+        self.length = 0  # positions recorded so far
+
+    @classmethod
+    def for_engine(cls, engine, block_size):
+        return cls(engine.n_layer, engine.n_head, engine.n_embd, block_size)
+
+    # called from gpt()
+    def embeddings(self, pos_id, tok_emb, pos_emb):
+        start = pos_id * self.n_embd
+        self.tok_emb[start:start + self.n_embd] = array('f', tok_emb)
+        self.pos_emb[start:start + self.n_embd] = array('f', pos_emb)
+        self.length = max(self.length, pos_id + 1)
+
+    def attention(self, layer, head, pos_id, weights):
+        start = ((layer * self.n_head + head) * self.block_size + pos_id) * self.block_size
+        self.attn[start:start + len(weights)] = array('f', weights)
+
+    # views
+    def embedding_arrays(self, start=0, end=None):
+        # token and position embeddings of positions [start, end)
+        end = self.length if end is None else end
+        n = self.n_embd
+        shape = (end - start, n)
+        return {'token': encode(self.tok_emb[start * n:end * n], shape),
+                'position': encode(self.pos_emb[start * n:end * n], shape)}
+
+    def attention_array(self, start=0, end=None):
+        # weights of query positions [start, end) over keys [0, end), as
+        # (n_layer, n_head, end - start, end); zero above the diagonal
+        end = self.length if end is None else end
+        out = array('f')
+        for layer in range(self.n_layer):
+            for head in range(self.n_head):
+                base = (layer * self.n_head + head) * self.block_size
+                for pos in range(start, end):
+                    row = (base + pos) * self.block_size
+                    out.extend(self.attn[row:row + end])
+        return encode(out, (self.n_layer, self.n_head, end - start, end))
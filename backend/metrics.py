@@ -0,0 +1,180 @@
+import io
+import sys
+import time
+import pstats
+import random
+import cProfile
+import threading
+from bisect import bisect_left
+
+# in-process metrics, served by /metrics in the prometheus text format.
+# every process keeps its own numbers: with several gunicorn workers each
+# scrape sees the worker that answered it, and generation that runs in the
+# INFERENCE_WORKERS pool is only visible as request latency.
+#
+# hot loops don't touch the metrics per step: they add up perf_counter()
+# deltas in locals and hand the totals over once per call (see stages()).
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (n, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+def _number(v):
+    return repr(float(v)) if v != float('inf') else '+Inf'
+
+# ─── METRICS ─────────────────────────────────
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> total
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def lines(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(v)}"
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+ overflow), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def lines(self):
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        names = self.labels + ('le',)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+class Gauge:
+    # read at scrape time: fn() returns a number or {label values: number}.
+    # kind='counter' for totals that something else already keeps (e.g. hits)
+    def __init__(self, name, help, fn, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.kind = kind
+
+    def lines(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, v in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(v)}"
+
+# ─── REGISTRY ────────────────────────────────
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=(), kind='gauge'):
+        return self.add(Gauge(name, help, fn, labels, kind))
+
+    def render(self):
+        out = []
+        for metric in self.metrics.values():
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        return '\n'.join(out) + '\n'
+
+# ─── DEFAULT METRICS ─────────────────────────
+registry = Registry()
+
+stage_seconds = registry.counter(
+    'microgpt_stage_seconds_total', 'time spent in each inference stage', ('stage',))
+stage_calls = registry.counter(
+    'microgpt_stage_calls_total', 'number of times each inference stage ran', ('stage',))
+tokens_generated = registry.counter(
+    'microgpt_tokens_generated_total', 'tokens sampled, including end-of-name tokens')
+graph_nodes = registry.counter(
+    'microgpt_graph_nodes_total', 'autograd Value nodes backpropagated through')
+request_seconds = registry.histogram(
+    'microgpt_request_seconds', 'request latency per route', ('route', 'method', 'status'))
+sse_frame_wait_seconds = registry.histogram(
+    'microgpt_sse_frame_wait_seconds', 'time an SSE frame waited for a thread before being computed')
+
+def stages(**seconds):
+    # e.g. stages(gpt=(0.012, 9), softmax=(0.001, 9)): (seconds, calls) per stage
+    for stage, (secs, calls) in seconds.items():
+        stage_seconds.inc(secs, (stage,))
+        stage_calls.inc(calls, (stage,))
+
+# ─── PROFILING ───────────────────────────────
+# a request runs under cProfile when it asks for it (?profile=1) or is
+# picked by PROFILE_SAMPLE_RATE; the top PROFILE_TOP functions by
+# cumulative time go to stderr. ?profile=1 is ignored unless PROFILE_REQUESTS=1.
+class RequestProfiler:
+    def __init__(self, allow=True, sample_rate=0.0, top=25, stream=None):
+        self.allow = allow
+        self.sample_rate = sample_rate
+        self.top = top
+        self.stream = stream
+        self._rng = random.Random()  # leave the global stream to model.py
+
+    def wanted(self, requested):
+        return (self.allow and requested) or (self.sample_rate > 0 and self._rng.random() < self.sample_rate)
+
+    def start(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler, time.perf_counter()
+
+    def finish(self, handle, label):
+        profiler, start = handle
+        profiler.disable()
+        out = io.StringIO()
+        out.write(f"profile of {label} ({(time.perf_counter() - start) * 1000:.1f} ms)\n")
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+        (self.stream or sys.stderr).write(out.getvalue())
+        return out.getvalue()
@@ -1,19 +1,28 @@
 import os
 import math
+import time
 import random
 import json
-
-random.seed(40)
-
-# ─── TOKENIZER ───────────────────────────────
-def load_vocab(filepath='input.txt'):
-    docs = [line.strip().lower() for line in open(filepath) if line.strip()]
-    unique_chars = sorted(set(''.join(docs)))
-    BOS = len(unique_chars)
-    vocab_size = len(unique_chars) + 1
-    return docs, unique_chars, BOS, vocab_size
-
-docs, unique_chars, BOS, vocab_size = load_vocab()
+import threading
+
+import checkpoint
+import metrics
+import quantize
+from inference import FloatGPT, export_weights, log_softmax
+from prefix_cache import PrefixCache
+from speculative import NgramDraft, Speculator
+from tokenizer import Tokenizer
+
+# the served model.
+# importing this module reads no files and builds no weights: everything
+# hangs off a MicroGPT, which loads in two steps, each on first use or
+# explicitly:
+#   tokenizer  from the vocab sidecar next to the checkpoint (model.vocab.json
+#              for model.bin), or from the corpus when there is none
+#   load()     the weights; ready() says whether that has happened yet
+#
+#   lm = model.get_model()   # the process-wide instance, nothing loaded
+#   lm.start_loading()       # load on a background thread, or lm.load()
 
 # ─── HYPERPARAMETERS ─────────────────────────
 n_layer = 1
@@ -24,6 +33,8 @@ head_dim = n_embd // n_head
 
 # ─── VALUE CLASS ─────────────────────────────
 class Value:
+    __slots__ = ('data', 'grad', '_children', '_local_grad')
+
     def __init__(self, data, children=(), local_grad=()):
         self.data = data
         self.grad = 0
@@ -38,20 +49,41 @@ class Value:
         other = other if isinstance(other, Value) else Value(other)
         return Value(self.data * other.data, (self, other), (other.data, self.data))
 
-    def backward(self):
+    def topo(self):
+        # every node this one depends on, children before parents.
+        # iterative, so deep graphs don't hit the recursion limit; a None on
+        # the stack means the node below it has all its children done
         topo = []
         visited = set()
-        def build_topo(v):
-            if v not in visited:
-                visited.add(v)
-                for child in v._children:
-                    build_topo(child)
-                topo.append(v)
-        build_topo(self)
+        stack = [self]
+        while stack:
+            v = stack.pop()
+            if v is None:
+                topo.append(stack.pop())
+                continue
+            if v in visited:
+                continue
+            visited.add(v)
+            stack.append(v)
+            stack.append(None)
+            for child in v._children:
+                if child not in visited:
+                    stack.append(child)
+        return topo
+
+    def backward(self, release=False):
+        # release=True cuts each node loose from its children once its
+        # gradient has been passed on, so the graph is freed while backward
+        # runs instead of after it. the graph can't be backpropagated again.
+        topo = self.topo()
+        metrics.graph_nodes.inc(len(topo))
         self.grad = 1
-        for v in reversed(topo):
+        while topo:
+            v = topo.pop()
             for child, local_grad in zip(v._children, v._local_grad):
                 child.grad += local_grad * v.grad
+            if release:
+                v._children = v._local_grad = ()
 
     def __pow__(self, other):
         return Value(self.data**other, (self,), (other * self.data**(other-1),))
@@ -70,147 +102,618 @@ class Value:
     def __rtruediv__(self, other): return other * self**-1
 
 # ─── HELPER FUNCTIONS ────────────────────────
+# fused ops: each output element is one Value whose children are the inputs
+# and whose local grads are the closed-form partials, instead of a chain of
+# scalar add/mul/pow/exp nodes. forward values are computed in the same
+# order as the scalar version so they stay bit-identical.
 def rmsnorm(x):
-    ms = sum(xi * xi for xi in x) / len(x)
+    xs = [xi.data for xi in x]
+    ms = 0
+    for xi in xs:
+        ms = ms + xi * xi
+    ms = ms * len(xs) ** -1
     scale = (ms + 1e-5) ** -0.5
-    return [xi * scale for xi in x]
+    # dy_i/dx_j = scale * [i == j] - y_i * x_j * scale^2 / n
+    c = scale * scale / len(xs)
+    x = tuple(x)
+    out = []
+    for i, xi in enumerate(xs):
+        yi = xi * scale
+        local_grad = [-yi * xj * c for xj in xs]
+        local_grad[i] += scale
+        out.append(Value(yi, x, local_grad))
+    return out
 
 def softmax(logits):
     max_val = max(val.data for val in logits)
-    exps = [(val - max_val).exp() for val in logits]
-    total = sum(exps)
-    return [e / total for e in exps]
+    exps = [math.exp(val.data - max_val) for val in logits]
+    total = 0
+    for e in exps:
+        total = total + e
+    inv_total = total ** -1
+    probs = [e * inv_total for e in exps]
+    # dp_i/dx_j = p_i * ([i == j] - p_j)
+    logits = tuple(logits)
+    out = []
+    for i, pi in enumerate(probs):
+        local_grad = [-pi * pj for pj in probs]
+        local_grad[i] += pi
+        out.append(Value(pi, logits, local_grad))
+    return out
 
 def linear(x, w):
+    # dy_o/dw_oi = x_i, dy_o/dx_i = w_oi
+    x = tuple(x)
+    xs = [xi.data for xi in x]
     output = []
     for wo in w:
+        ws = [wi.data for wi in wo]
         row_sum = 0
-        for wi, xi in zip(wo, x):
+        for wi, xi in zip(ws, xs):
             row_sum = row_sum + wi * xi
-        output.append(row_sum)
+        output.append(Value(row_sum, (*wo, *x), xs + ws))
     return output
 
 # ─── MODEL PARAMETERS ────────────────────────
-matrix = lambda nout, nin, std=0.08: [[Value(random.gauss(0, std)) for _ in range(nin)] for _ in range(nout)]
-
-state_dict = {
-    'wte': matrix(vocab_size, n_embd),
-    'wpe': matrix(block_size, n_embd),
-    'lm_head': matrix(vocab_size, n_embd)
-}
-for i in range(n_layer):
-    state_dict[f'layer{i}.attn_wq'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wk'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wv'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.attn_wo'] = matrix(n_embd, n_embd)
-    state_dict[f'layer{i}.mlp_fc1'] = matrix(4 * n_embd, n_embd)
-    state_dict[f'layer{i}.mlp_fc2'] = matrix(n_embd, 4 * n_embd)
-
-params = [p for mat in state_dict.values() for row in mat for p in row]
-
-# ─── GPT FORWARD PASS ────────────────────────
-def gpt(token_id, pos_id, keys, values):
-    tok_emb = state_dict['wte'][token_id]
-    pos_emb = state_dict['wpe'][pos_id]
-    x = [t + p for t, p in zip(tok_emb, pos_emb)]
-    x = rmsnorm(x)
-
-    for li in range(n_layer):
-        x_residual = x
-        x = rmsnorm(x)
-        q = linear(x, state_dict[f'layer{li}.attn_wq'])
-        k = linear(x, state_dict[f'layer{li}.attn_wk'])
-        v = linear(x, state_dict[f'layer{li}.attn_wv'])
-        keys[li].append(k)
-        values[li].append(v)
-
-        x_attn = []
-        for h in range(n_head):
-            start = h * head_dim
-            end = start + head_dim
-            q_h = q[start:end]
-            k_h = [ki[start:end] for ki in keys[li]]
-            v_h = [vi[start:end] for vi in values[li]]
-
-            attn_scores = []
-            for t in range(len(k_h)):
-                score = 0
-                for j in range(head_dim):
-                    score = score + q_h[j] * k_h[t][j]
-                score = score / head_dim**0.5
-                attn_scores.append(score)
-
-            attn_weights = softmax(attn_scores)
-
-            head_output = []
-            for j in range(head_dim):
-                weighted_sum = 0
-                for t in range(len(v_h)):
-                    weighted_sum = weighted_sum + attn_weights[t] * v_h[t][j]
-                head_output.append(weighted_sum)
-
-            x_attn.extend(head_output)
-
-        x = linear(x_attn, state_dict[f'layer{li}.attn_wo'])
-        x = [a + b for a, b in zip(x, x_residual)]
+def param_shapes(vocab_size):
+    shapes = {
+        'wte': (vocab_size, n_embd),
+        'wpe': (block_size, n_embd),
+        'lm_head': (vocab_size, n_embd),
+    }
+    for i in range(n_layer):
+        shapes[f'layer{i}.attn_wq'] = (n_embd, n_embd)
+        shapes[f'layer{i}.attn_wk'] = (n_embd, n_embd)
+        shapes[f'layer{i}.attn_wv'] = (n_embd, n_embd)
+        shapes[f'layer{i}.attn_wo'] = (n_embd, n_embd)
+        shapes[f'layer{i}.mlp_fc1'] = (4 * n_embd, n_embd)
+        shapes[f'layer{i}.mlp_fc2'] = (n_embd, 4 * n_embd)
+    return shapes
+
+def init_state_dict(vocab_size, seed=40):
+    # Value parameters with the random init training starts from
+    rng = random.Random(seed)
+    matrix = lambda nout, nin, std=0.08: [[Value(rng.gauss(0, std)) for _ in range(nin)] for _ in range(nout)]
+    return {name: matrix(nout, nin) for name, (nout, nin) in param_shapes(vocab_size).items()}
+
+# ─── VOCAB SIDECAR ───────────────────────────
+# a small json file next to each checkpoint with the vocabulary and the
+# hyperparameters it was trained with, so serving never reads the corpus
+def load_docs(filepath='input.txt'):
+    with open(filepath) as f:
+        return [line.strip().lower() for line in f if line.strip()]
+
+def metadata_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + '.vocab.json'
+
+def save_metadata(filepath, tokenizer):
+    meta = {
+        'chars': tokenizer.chars,
+        'vocab_size': tokenizer.vocab_size,
+        'BOS': tokenizer.BOS,
+        'n_layer': n_layer,
+        'n_embd': n_embd,
+        'n_head': n_head,
+        'block_size': block_size,
+    }
+    with open(filepath, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+def load_metadata(filepath):
+    with open(filepath) as f:
+        meta = json.load(f)
+    expected = {'n_layer': n_layer, 'n_embd': n_embd, 'n_head': n_head, 'block_size': block_size}
+    for key, value in expected.items():
+        if meta[key] != value:
+            raise ValueError(f"{filepath}: {key} is {meta[key]}, model.py has {value}")
+    return meta
+
+# ─── MICROGPT ────────────────────────────────
+# SHARED_WEIGHTS=1: serve only from read-only mmap segments. combined with
+# gunicorn's preload_app (see gunicorn.conf.py) the master loads the weights
+# once and every forked worker reads the same pages. plain python float lists
+# would be copied into each worker as soon as refcounts touch them.
+shared_weights = os.environ.get('SHARED_WEIGHTS') == '1'
+unique_budget = int(os.environ.get('UNIQUE_BUDGET_PER_NAME', 20))
+
+def default_checkpoint():
+    # MODEL_PATH picks the checkpoint (e.g. a quantized model.i8.bin);
+    # otherwise prefers model.bin and falls back to the legacy json list
+    path = os.environ.get('MODEL_PATH')
+    if path is None:
+        path = 'model.bin' if os.path.exists('model.bin') else 'model.json'
+    return path
+
+class MicroGPT:
+    def __init__(self, checkpoint_path=None, corpus_path='input.txt'):
+        self.checkpoint_path = checkpoint_path or default_checkpoint()
+        self.corpus_path = corpus_path
+        # KV cache for prompt prefixes shared by every request in this process.
+        # cached keys/values are only valid for the weights that produced them.
+        self.prefix_cache = PrefixCache(max_bytes=int(os.environ.get('PREFIX_CACHE_BYTES', 8 * 1024 * 1024)))
+        # bumped whenever the served weights change; part of every cache key
+        # for results derived from them
+        self.model_version = 0
+        self.engine = None
+        self.load_error = None  # set if start_loading() failed
+        self._tokenizer = None
+        self._docs = None
+        self._doc_set = None
+        self._state_dict = None
+        self._ckpt = None
+        self._speculator = None
+        self._lock = threading.RLock()
+        self._loaded = threading.Event()
+
+    # vocab and corpus
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    sidecar = metadata_path(self.checkpoint_path)
+                    if os.path.exists(sidecar):
+                        self._tokenizer = Tokenizer(load_metadata(sidecar)['chars'])
+                    else:
+                        self._tokenizer = Tokenizer.from_docs(self.docs)
+        return self._tokenizer
+
+    @property
+    def BOS(self):
+        return self.tokenizer.BOS
+
+    @property
+    def vocab_size(self):
+        return self.tokenizer.vocab_size
+
+    @property
+    def unique_chars(self):
+        return self.tokenizer.chars
+
+    @property
+    def docs(self):
+        # the training names; only the speculative draft model and the
+        # novelty check of generate_unique() need them
+        if self._docs is None:
+            with self._lock:
+                if self._docs is None:
+                    self._docs = load_docs(self.corpus_path)
+        return self._docs
+
+    @property
+    def doc_set(self):
+        # training names, for O(1) novelty checks
+        if self._doc_set is None:
+            self._doc_set = frozenset(self.docs)
+        return self._doc_set
+
+    # weights
+    @property
+    def state_dict(self):
+        # Value parameters for the autograd gpt(): the loaded weights, or the
+        # random init when there is no checkpoint. serving never needs them
+        if self._state_dict is None:
+            with self._lock:
+                if self._state_dict is None:
+                    state_dict = init_state_dict(self.vocab_size)
+                    if self._ckpt is not None:
+                        for name, mat in state_dict.items():
+                            for row, data in zip(mat, quantize.float_rows(self._ckpt, name)):
+                                for p, d in zip(row, data):
+                                    p.data = d
+                    self._state_dict = state_dict
+        return self._state_dict
+
+    @property
+    def params(self):
+        return [p for mat in self.state_dict.values() for row in mat for p in row]
+
+    def ready(self):
+        return self._loaded.is_set()
+
+    def load(self):
+        # loads the weights once; returns self
+        if not self._loaded.is_set():
+            with self._lock:
+                if not self._loaded.is_set():
+                    self._load()
+                    self._loaded.set()
+        return self
+
+    def start_loading(self):
+        # load() on a daemon thread; errors end up in load_error
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                self.load_error = e
+                raise
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self):
+        filepath = self.checkpoint_path
+        shapes = param_shapes(self.vocab_size)
+        if not os.path.exists(filepath):
+            # untrained: serve the random init
+            self.refresh_engine()
+            return
+
+        if checkpoint.is_checkpoint(filepath):
+            ckpt = checkpoint.load(filepath)
+            for name, shape in shapes.items():
+                if ckpt.shape(name) != shape:
+                    raise ValueError(f"{name}: checkpoint shape {ckpt.shape(name)} does not match model")
+            self._ckpt = ckpt
+            self.refresh_engine(quantize.engine_weights(ckpt, shapes))
+        else:
+            with open(filepath, 'r') as f:
+                params_data = json.load(f)
+            for p, d in zip(self.params, params_data):
+                p.data = d
+            if shared_weights:
+                shared = checkpoint.share(self.state_tensors())
+                self.refresh_engine({name: shared.rows(name) for name in shapes})
+            else:
+                self.refresh_engine()
+        print("Model loaded successfully!")
 
-        x_residual = x
+    def refresh_engine(self, weights=None):
+        # weights: optional {name: rows} to serve from directly (e.g. views
+        # into a memory-mapped checkpoint) instead of a snapshot of state_dict
+        with self._lock:
+            if weights is None:
+                weights = export_weights(self.state_dict)
+            if self.engine is None:
+                self.engine = FloatGPT(weights, n_layer, n_head)
+            else:
+                self.engine.weights = weights
+            self.prefix_cache.clear()
+            self.model_version += 1
+
+    def state_tensors(self):
+        return {
+            name: ((len(mat), len(mat[0])), [p.data for row in mat for p in row])
+            for name, mat in self.state_dict.items()
+        }
+
+    def save(self, filepath='model.bin'):
+        checkpoint.save(filepath, self.state_tensors())
+        save_metadata(metadata_path(filepath), self.tokenizer)
+        print(f"Model saved to {filepath}")
+
+    # autograd forward pass
+    def gpt(self, token_id, pos_id, keys, values):
+        # Value graph over state_dict, for gradient checks; serving uses
+        # self.engine, a float snapshot of the same weights
+        state_dict = self.state_dict
+        tok_emb = state_dict['wte'][token_id]
+        pos_emb = state_dict['wpe'][pos_id]
+        x = [t + p for t, p in zip(tok_emb, pos_emb)]
         x = rmsnorm(x)
-        x = linear(x, state_dict[f'layer{li}.mlp_fc1'])
-        x = [xi.relu() for xi in x]
-        x = linear(x, state_dict[f'layer{li}.mlp_fc2'])
-        x = [a + b for a, b in zip(x, x_residual)]
 
-    logits = linear(x, state_dict['lm_head'])
-    return logits
-
-# ─── SAVE / LOAD ─────────────────────────────
-def save_model(filepath='model.json'):
-    params_data = [p.data for p in params]
-    with open(filepath, 'w') as f:
-        json.dump(params_data, f)
-    print(f"Model saved to {filepath}")
-
-def load_model(filepath='model.json'):
-    if os.path.exists(filepath):
-        with open(filepath, 'r') as f:
-            params_data = json.load(f)
-        for p, d in zip(params, params_data):
-            p.data = d
-        print("Model loaded successfully!")
-        return True
-    return False
-
-# ─── GENERATE ────────────────────────────────
-def generate(prefix='', temperature=0.5):
-    keys = [[] for _ in range(n_layer)]
-    values = [[] for _ in range(n_layer)]
-    sample = list(prefix)
-
-    if prefix:
-        for pos_id, ch in enumerate(prefix):
-            if ch not in unique_chars:
-                return f"unknown character: {ch}"
-            token_id = unique_chars.index(ch)
-            gpt(token_id, pos_id, keys, values)
-        start_pos = len(prefix)
-        token_id = unique_chars.index(prefix[-1])
-    else:
-        start_pos = 0
-        token_id = BOS
-
-    for pos_id in range(start_pos, block_size):
-        logits = gpt(token_id, pos_id, keys, values)
-        probs = softmax([l / temperature for l in logits])
-        token_id = random.choices(
-            range(vocab_size),
-            weights=[p.data for p in probs]
-        )[0]
-        if token_id == BOS:
-            break
-        sample.append(unique_chars[token_id])
-
-    return ''.join(sample)
-
-# ─── AUTO LOAD ───────────────────────────────
-load_model()
+        for li in range(n_layer):
+            x_residual = x
+            x = rmsnorm(x)
+            q = linear(x, state_dict[f'layer{li}.attn_wq'])
+            k = linear(x, state_dict[f'layer{li}.attn_wk'])
+            v = linear(x, state_dict[f'layer{li}.attn_wv'])
+            keys[li].append(k)
+            values[li].append(v)
+
+            x_attn = []
+            for h in range(n_head):
+                start = h * head_dim
+                end = start + head_dim
+                q_h = q[start:end]
+                k_h = [ki[start:end] for ki in keys[li]]
+                v_h = [vi[start:end] for vi in values[li]]
+
+                attn_scores = []
+                for t in range(len(k_h)):
+                    score = 0
+                    for j in range(head_dim):
+                        score = score + q_h[j] * k_h[t][j]
+                    score = score / head_dim**0.5
+                    attn_scores.append(score)
+
+                attn_weights = softmax(attn_scores)
+
+                head_output = []
+                for j in range(head_dim):
+                    weighted_sum = 0
+                    for t in range(len(v_h)):
+                        weighted_sum = weighted_sum + attn_weights[t] * v_h[t][j]
+                    head_output.append(weighted_sum)
+
+                x_attn.extend(head_output)
+
+            x = linear(x_attn, state_dict[f'layer{li}.attn_wo'])
+            x = [a + b for a, b in zip(x, x_residual)]
+
+            x_residual = x
+            x = rmsnorm(x)
+            x = linear(x, state_dict[f'layer{li}.mlp_fc1'])
+            x = [xi.relu() for xi in x]
+            x = linear(x, state_dict[f'layer{li}.mlp_fc2'])
+            x = [a + b for a, b in zip(x, x_residual)]
+
+        logits = linear(x, state_dict['lm_head'])
+        return logits
+
+    # prefill
+    def prefill(self, token_ids):
+        # KV caches after feeding token_ids, reusing the longest cached prefix
+        self.load()
+        matched, keys, values = self.prefix_cache.lookup(token_ids, n_layer)
+        if matched < len(token_ids):
+            start = time.perf_counter()
+            for pos_id in range(matched, len(token_ids)):
+                self.engine.gpt(token_ids[pos_id], pos_id, keys, values)
+            metrics.stages(prefill=(time.perf_counter() - start, len(token_ids) - matched))
+            self.prefix_cache.insert(token_ids, keys, values)
+        return keys, values
+
+    # generate
+    # rng: a random.Random to sample from; defaults to the global random module.
+    # pass a private one per request so concurrent requests don't share a stream
+    # and a seeded request is reproducible.
+    def generate(self, prefix='', temperature=0.5, rng=None):
+        rng = rng or random
+        tokenizer, BOS = self.tokenizer, self.BOS
+        sample = list(prefix)
+
+        unknown = tokenizer.unknown(prefix)
+        if unknown is not None:
+            return f"unknown character: {unknown}"
+        prefix_ids = tokenizer.encode(prefix)
+        keys, values = self.prefill(prefix_ids)
+        engine = self.engine
+
+        if prefix:
+            start_pos = len(prefix)
+            token_id = prefix_ids[-1]
+        else:
+            start_pos = 0
+            token_id = BOS
+
+        clock = time.perf_counter
+        t_gpt = t_softmax = t_sample = 0.0
+        steps = 0
+        for pos_id in range(start_pos, block_size):
+            t0 = clock()
+            logits = engine.gpt(token_id, pos_id, keys, values)
+            t1 = clock()
+            probs = engine.probs(logits, temperature)
+            t2 = clock()
+            token_id = rng.choices(
+                range(self.vocab_size),
+                weights=probs
+            )[0]
+            t_gpt += t1 - t0
+            t_softmax += t2 - t1
+            t_sample += clock() - t2
+            steps += 1
+            if token_id == BOS:
+                break
+            sample.append(tokenizer.itos[token_id])
+
+        metrics.stages(gpt=(t_gpt, steps), softmax=(t_softmax, steps), sample=(t_sample, steps))
+        metrics.tokens_generated.inc(steps)
+        return ''.join(sample)
+
+    # speculative generate
+    # same output distribution as generate(); an n-gram draft model counted from
+    # docs proposes up to SPECULATIVE_DRAFT_LEN characters per transformer pass.
+    # here a checked position costs almost as much as a generated one, so this
+    # only pays off when drafts are accepted often; bench.py measures it
+    @property
+    def speculator(self):
+        if self._speculator is None:
+            with self._lock:
+                if self._speculator is None:
+                    self.load()
+                    draft = NgramDraft(self.docs, self.tokenizer, order=int(os.environ.get('SPECULATIVE_ORDER', 4)))
+                    self._speculator = Speculator(
+                        self.engine, draft, block_size,
+                        draft_len=int(os.environ.get('SPECULATIVE_DRAFT_LEN', 6)),
+                        min_confidence=float(os.environ.get('SPECULATIVE_MIN_CONFIDENCE', 0.3)))
+        return self._speculator
+
+    def speculative_stats(self):
+        # counters of the speculator, without building it
+        if self._speculator is None:
+            return {'proposed': 0, 'accepted': 0, 'passes': 0, 'tokens': 0,
+                    'acceptance_rate': 0.0, 'tokens_per_pass': 0.0}
+        return self._speculator.stats()
+
+    def generate_speculative(self, prefix='', temperature=0.5, rng=None):
+        rng = rng or random
+        tokenizer, BOS = self.tokenizer, self.BOS
+        unknown = tokenizer.unknown(prefix)
+        if unknown is not None:
+            return f"unknown character: {unknown}"
+        prefix_ids = tokenizer.encode(prefix)
+        keys, values = self.prefill(prefix_ids)
+
+        if prefix:
+            start_pos = len(prefix)
+            token_id = prefix_ids[-1]
+        else:
+            start_pos = 0
+            token_id = BOS
+
+        sample = self.speculator.sample(token_id, start_pos, keys, values,
+                                        [BOS] + prefix_ids, temperature, rng)
+        return prefix + tokenizer.decode(sample)
+
+    # batched generate
+    def generate_batch(self, prefix='', temperature=0.5, count=1, rng=None):
+        # advances all `count` samples one position at a time.
+        # samples whose token history is identical have identical KV caches and
+        # logits, so they are kept together in one group and share a single
+        # forward pass; a group splits (forking its cache) when its members
+        # sample different tokens, and a sample retires when it samples BOS.
+        rng = rng or random
+        tokenizer, BOS = self.tokenizer, self.BOS
+        unknown = tokenizer.unknown(prefix)
+        if unknown is not None:
+            return [f"unknown character: {unknown}"] * count
+
+        prefix_ids = tokenizer.encode(prefix)
+        keys, values = self.prefill(prefix_ids)
+        engine = self.engine
+        samples = [list(prefix) for _ in range(count)]
+
+        if prefix:
+            start_pos = len(prefix)
+            token_id = prefix_ids[-1]
+        else:
+            start_pos = 0
+            token_id = BOS
+
+        clock = time.perf_counter
+        t_gpt = t_softmax = t_sample = 0.0
+        steps = tokens = 0
+        # each group: (next token, keys, values, sample indices)
+        groups = [(token_id, keys, values, list(range(count)))]
+        for pos_id in range(start_pos, block_size):
+            next_groups = []
+            for token_id, keys, values, members in groups:
+                t0 = clock()
+                logits = engine.gpt(token_id, pos_id, keys, values)
+                t1 = clock()
+                probs = engine.probs(logits, temperature)
+                t2 = clock()
+                picks = rng.choices(range(self.vocab_size), weights=probs, k=len(members))
+                t_gpt += t1 - t0
+                t_softmax += t2 - t1
+                t_sample += clock() - t2
+                steps += 1
+                tokens += len(members)
+
+                by_token = {}
+                for i, t in zip(members, picks):
+                    if t == BOS:
+                        continue
+                    samples[i].append(tokenizer.itos[t])
+                    by_token.setdefault(t, []).append(i)
+
+                for n, (t, ids) in enumerate(by_token.items()):
+                    if n == len(by_token) - 1:
+                        next_groups.append((t, keys, values, ids))
+                    else:
+                        next_groups.append((t, fork_cache(keys), fork_cache(values), ids))
+            groups = next_groups
+            if not groups:
+                break
+
+        metrics.stages(gpt=(t_gpt, steps), softmax=(t_softmax, steps), sample=(t_sample, steps))
+        metrics.tokens_generated.inc(tokens)
+        return [''.join(s) for s in samples]
+
+    def generate_names(self, prefix='', temperature=0.5, count=1, rng=None, speculative=False):
+        if not speculative:
+            return self.generate_batch(prefix, temperature, count, rng)
+        return [self.generate_speculative(prefix, temperature, rng) for _ in range(count)]
+
+    # unique generate
+    def generate_unique(self, prefix='', temperature=0.5, count=1, rng=None, speculative=False, budget=None):
+        # samples in batches until there are `count` distinct names that are not
+        # in the training docs, or until `budget` samples (default
+        # UNIQUE_BUDGET_PER_NAME per name) have been drawn, in which case fewer
+        # names come back. returns (names, number of samples thrown away)
+        unknown = self.tokenizer.unknown(prefix)
+        if unknown is not None:
+            return [f"unknown character: {unknown}"] * count, 0
+        budget = count * unique_budget if budget is None else budget
+        doc_set = self.doc_set
+        names, seen = [], set()
+        sampled = 0
+        while len(names) < count and sampled < budget:
+            # oversample: low temperatures repeat themselves a lot
+            batch = min(2 * (count - len(names)), budget - sampled)
+            sampled += batch
+            for name in self.generate_names(prefix, temperature, batch, rng, speculative):
+                if name and name not in seen and name not in doc_set:
+                    seen.add(name)
+                    names.append(name)
+                    if len(names) == count:
+                        break
+        return names, sampled - len(names)
+
+    # score
+    def score(self, texts):
+        # log-likelihood of each text the way training sees it: BOS, the
+        # characters, BOS again. all texts go into one trie of token ids and the
+        # trie is walked depth first, so every distinct prefix is run through
+        # gpt() once, however many texts share it; siblings fork the caches.
+        tokenizer, BOS = self.tokenizer, self.BOS
+        results = [None] * len(texts)
+        root = {}  # token id -> [log prob, children]
+        paths = []
+        for i, text in enumerate(texts):
+            unknown = tokenizer.unknown(text)
+            if unknown is not None:
+                results[i] = {'text': text, 'error': f"unknown character: {unknown}"}
+                continue
+            if len(text) >= block_size:
+                results[i] = {'text': text, 'error': f"longer than {block_size - 1} characters"}
+                continue
+            ids = tokenizer.encode(text) + [BOS]
+            node = root
+            for t in ids:
+                node = node.setdefault(t, [None, {}])[1]
+            paths.append((i, text, ids))
+
+        engine = self.load().engine
+        start = time.perf_counter()
+        steps = 0
+        # (token to feed, its position, children, keys, values)
+        stack = [(BOS, 0, root, [[] for _ in range(n_layer)], [[] for _ in range(n_layer)])] if root else []
+        while stack:
+            token_id, pos_id, children, keys, values = stack.pop()
+            log_probs = log_softmax(engine.gpt(token_id, pos_id, keys, values))
+            steps += 1
+            branches = [(t, entry) for t, entry in children.items() if entry[1]]
+            for t, entry in children.items():
+                entry[0] = log_probs[t]
+            for n, (t, entry) in enumerate(branches):
+                if n < len(branches) - 1:
+                    stack.append((t, pos_id + 1, entry[1], fork_cache(keys), fork_cache(values)))
+                else:
+                    stack.append((t, pos_id + 1, entry[1], keys, values))
+
+        metrics.stages(score=(time.perf_counter() - start, steps))
+
+        for i, text, ids in paths:
+            node, char_log_probs = root, []
+            for t in ids:
+                log_prob, node = node[t]
+                char_log_probs.append(log_prob)
+            total = sum(char_log_probs)
+            results[i] = {
+                'text': text,
+                'log_prob': total,
+                'char_log_probs': char_log_probs[:-1],
+                'end_log_prob': char_log_probs[-1],
+                'perplexity': math.exp(-total / len(ids)),
+            }
+        return results
+
+def fork_cache(cache):
+    # new per-layer lists, shared (never mutated) k/v vectors
+    return [list(layer) for layer in cache]
+
+# ─── DEFAULT MODEL ───────────────────────────
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    # the process-wide MicroGPT; created on first call, loaded on first use
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = MicroGPT()
+    return _model
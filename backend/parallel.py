@@ -0,0 +1,93 @@
+import multiprocessing
+
+import numpy as np
+
+# data-parallel training across cpu cores.
+# each minibatch is split into contiguous shards, one per worker process.
+# a worker pulls the current weights from shared memory, runs forward and
+# backward on its shard, and writes its gradient into its own slot of a
+# shared buffer. the master sums the slots (the all-reduce) and runs a single
+# optimizer update, so every step sees the same gradient as one process would.
+#
+# workers are forked, so they inherit the model and the loss function from
+# the training script as they were when the pool was created.
+#
+# the loss function takes a list of documents and returns the sum of their
+# losses as a scalar Tensor (or anything with .data and .backward()).
+
+# ─── GRADIENTS ───────────────────────────────
+def compute_grads(loss_fn, batch):
+    # accumulates d(sum of doc losses) into the parameters' .grad;
+    # returns the summed loss
+    loss = loss_fn(batch)
+    loss.backward()
+    return float(loss.data[0])
+
+def shard(batch, n):
+    # n contiguous, near-equal slices of batch
+    size, extra = divmod(len(batch), n)
+    shards, start = [], 0
+    for i in range(n):
+        end = start + size + (i < extra)
+        shards.append(batch[start:end])
+        start = end
+    return shards
+
+# ─── WORKER ──────────────────────────────────
+_worker = {}
+
+def _run_shard(slot, docs):
+    params, loss_fn = _worker['params'], _worker['loss_fn']
+    weights, grads, size = _worker['weights'], _worker['grads'], _worker['size']
+
+    offset = 0
+    for p in params:
+        n = p.data.size
+        p.data[...] = weights[offset:offset + n].reshape(p.shape)
+        p.zero_grad()
+        offset += n
+
+    loss = compute_grads(loss_fn, docs)
+
+    offset = slot * size
+    for p in params:
+        grads[offset:offset + p.grad.size] = p.grad.ravel()
+        offset += p.grad.size
+    return loss
+
+# ─── DATA PARALLEL ───────────────────────────
+class DataParallel:
+    def __init__(self, params, loss_fn, num_workers):
+        self.params = params
+        self.loss_fn = loss_fn
+        self.num_workers = num_workers
+        self.size = sum(p.data.size for p in params)
+        # numpy views of shared memory, inherited by the forked workers
+        self.weights = np.frombuffer(multiprocessing.RawArray('d', self.size))
+        self.grads = np.frombuffer(multiprocessing.RawArray('d', num_workers * self.size))
+
+        _worker.update(params=params, loss_fn=loss_fn, weights=self.weights,
+                       grads=self.grads, size=self.size)
+        self.pool = multiprocessing.get_context('fork').Pool(num_workers)
+
+    def grads_for(self, batch):
+        # sets each parameter's .grad to d(sum of doc losses) over batch
+        # and returns the summed loss
+        offset = 0
+        for p in self.params:
+            self.weights[offset:offset + p.data.size] = p.data.ravel()
+            offset += p.data.size
+
+        shards = [s for s in shard(batch, self.num_workers) if s]
+        losses = self.pool.starmap(_run_shard, enumerate(shards))
+
+        total = self.grads.reshape(self.num_workers, self.size)[:len(shards)].sum(axis=0)
+        offset = 0
+        for p in self.params:
+            p.grad = total[offset:offset + p.data.size].reshape(p.shape)
+            offset += p.data.size
+        return sum(losses)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
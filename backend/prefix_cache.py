@@ -0,0 +1,123 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# process-wide KV cache for prompt prefixes.
+# a trie keyed by token id: the node at depth d holds the per-layer keys and
+# values the model produced for position d-1 of that prefix. a request forks
+# the caches of the longest matching path and only runs gpt() on the rest.
+#
+# eviction is LRU over nodes. touching a path refreshes it leaf-first, so a
+# parent is always more recent than its children and the least recently used
+# node is always a leaf that can be dropped on its own.
+
+FLOAT_BYTES = sys.getsizeof(0.0)
+NODE_OVERHEAD = 200
+
+# ─── TRIE NODE ───────────────────────────────
+class _Node:
+    __slots__ = ('parent', 'token_id', 'children', 'keys', 'values', 'nbytes')
+
+    def __init__(self, parent, token_id, keys=None, values=None):
+        self.parent = parent
+        self.token_id = token_id
+        self.children = {}
+        self.keys = keys
+        self.values = values
+        self.nbytes = 0
+        if keys is not None:
+            self.nbytes = NODE_OVERHEAD + sum(
+                sys.getsizeof(vec) + len(vec) * FLOAT_BYTES for vec in keys + values
+            )
+
+# ─── PREFIX CACHE ────────────────────────────
+class PrefixCache:
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._root = _Node(None, None)
+            self._lru = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.partial_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def lookup(self, token_ids, n_layer):
+        # returns (matched length, keys, values) with fresh per-layer lists
+        keys = [[] for _ in range(n_layer)]
+        values = [[] for _ in range(n_layer)]
+        if not token_ids:
+            # nothing to look up (no prefix): not counted as a hit or a miss
+            return 0, keys, values
+        with self._lock:
+            node = self._root
+            path = []
+            for token_id in token_ids:
+                child = node.children.get(token_id)
+                if child is None:
+                    break
+                path.append(child)
+                node = child
+            for child in path:
+                for li in range(n_layer):
+                    keys[li].append(child.keys[li])
+                    values[li].append(child.values[li])
+            self._touch(path)
+
+            if not path:
+                self.misses += 1
+            elif len(path) == len(token_ids):
+                self.hits += 1
+            else:
+                self.partial_hits += 1
+        return len(path), keys, values
+
+    def insert(self, token_ids, keys, values):
+        # keys/values: per-layer lists covering at least len(token_ids) positions
+        n_layer = len(keys)
+        with self._lock:
+            node = self._root
+            path = []
+            for pos_id, token_id in enumerate(token_ids):
+                child = node.children.get(token_id)
+                if child is None:
+                    child = _Node(
+                        node, token_id,
+                        [keys[li][pos_id] for li in range(n_layer)],
+                        [values[li][pos_id] for li in range(n_layer)],
+                    )
+                    node.children[token_id] = child
+                    self.nbytes += child.nbytes
+                path.append(child)
+                node = child
+            self._touch(path)
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._lru),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'partial_hits': self.partial_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _touch(self, path):
+        for node in reversed(path):
+            self._lru[id(node)] = node
+            self._lru.move_to_end(id(node))
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._lru:
+            _, node = self._lru.popitem(last=False)
+            del node.parent.children[node.token_id]
+            self.nbytes -= node.nbytes
+            self.evictions += 1
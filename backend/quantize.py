@@ -0,0 +1,111 @@
+import os
+import math
+
+import checkpoint
+from inference import FloatGPT, Int8Matrix, softmax
+
+# post-training weight quantization for serving.
+#
+#   python quantize.py model.bin model.i8.bin              per-row int8
+#   python quantize.py model.bin model.f16.bin --dtype f16
+#
+# int8 stores each weight row as ints in [-127, 127] plus one f64 scale and
+# is served straight from the memory-mapped file (1 byte per weight instead
+# of 8). f16 halves the file only, as it is decoded to float32 on load.
+# both print top-1 agreement and perplexity against the source checkpoint
+# on input.txt. serve a variant with MODEL_PATH=model.i8.bin.
+
+# ─── QUANTIZE ────────────────────────────────
+def quantize_row(row):
+    # symmetric: the largest magnitude in the row maps to 127
+    amax = max(abs(w) for w in row)
+    scale = amax / 127 if amax else 1.0
+    return [max(-127, min(127, round(w / scale))) for w in row], scale
+
+def quantize(src_path, out_path, dtype='i8'):
+    ckpt = checkpoint.load(src_path)
+    if ckpt.meta.get('quantized'):
+        raise ValueError(f"{src_path} is already quantized")
+    tensors = {}
+    for name in ckpt.names():
+        shape = ckpt.shape(name)
+        if dtype == 'f16':
+            tensors[name] = (shape, ckpt.flat(name), 'f16')
+            continue
+        ints, scales = [], []
+        for row in ckpt.rows(name):
+            q, scale = quantize_row(row)
+            ints += q
+            scales.append(scale)
+        tensors[name] = (shape, ints, 'i8')
+        tensors[f'{name}.scale'] = ((shape[0],), scales, 'f64')
+    meta = dict(ckpt.meta, quantized=dtype, source=os.path.basename(src_path))
+    checkpoint.save(out_path, tensors, meta)
+
+# ─── LOAD ────────────────────────────────────
+def engine_weights(ckpt, names):
+    # {name: rows or Int8Matrix} for FloatGPT, zero-copy where possible
+    if ckpt.meta.get('quantized') == 'i8':
+        return {name: Int8Matrix(ckpt.rows(name), ckpt.flat(f'{name}.scale')) for name in names}
+    return {name: ckpt.rows(name) for name in names}
+
+def float_rows(ckpt, name):
+    # weights as plain float rows, dequantized if needed
+    if ckpt.meta.get('quantized') == 'i8':
+        return list(Int8Matrix(ckpt.rows(name), ckpt.flat(f'{name}.scale')))
+    return ckpt.rows(name)
+
+# ─── REPORT ──────────────────────────────────
+def compare(reference, candidate, sequences, n_layer):
+    # teacher-forced next-token predictions of both engines over sequences
+    agree = total = 0
+    nll_ref = nll_cand = 0.0
+    for tokens in sequences:
+        caches = [([[] for _ in range(n_layer)], [[] for _ in range(n_layer)]) for _ in range(2)]
+        for pos_id, (token_id, target_id) in enumerate(zip(tokens, tokens[1:])):
+            ref = reference.gpt(token_id, pos_id, *caches[0])
+            cand = candidate.gpt(token_id, pos_id, *caches[1])
+            agree += max(range(len(ref)), key=ref.__getitem__) == max(range(len(cand)), key=cand.__getitem__)
+            nll_ref -= math.log(softmax(ref)[target_id])
+            nll_cand -= math.log(softmax(cand)[target_id])
+            total += 1
+    return {
+        'positions': total,
+        'top1_agreement': agree / total,
+        'perplexity': math.exp(nll_ref / total),
+        'quantized_perplexity': math.exp(nll_cand / total),
+    }
+
+def report(src_path, out_path, input_path='input.txt'):
+    import model
+    tokenizer = model.MicroGPT(src_path, input_path).tokenizer
+    names = list(model.param_shapes(tokenizer.vocab_size))
+    reference = FloatGPT(engine_weights(checkpoint.load(src_path), names), model.n_layer, model.n_head)
+    candidate = FloatGPT(engine_weights(checkpoint.load(out_path), names), model.n_layer, model.n_head)
+    BOS = tokenizer.BOS
+    docs = model.load_docs(input_path)
+    sequences = [([BOS] + tokenizer.encode(doc) + [BOS])[:model.block_size + 1] for doc in docs]
+    result = compare(reference, candidate, sequences, model.n_layer)
+    result['bytes'] = os.path.getsize(src_path)
+    result['quantized_bytes'] = os.path.getsize(out_path)
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='quantize a model checkpoint for serving')
+    parser.add_argument('src_path', nargs='?', default='model.bin')
+    parser.add_argument('out_path', nargs='?', default='model.i8.bin')
+    parser.add_argument('--dtype', choices=['i8', 'f16'], default='i8')
+    parser.add_argument('--no-report', action='store_true', help='skip the accuracy report')
+    args = parser.parse_args()
+
+    import model
+    quantize(args.src_path, args.out_path, args.dtype)
+    model.save_metadata(model.metadata_path(args.out_path), model.MicroGPT(args.src_path).tokenizer)
+    print(f"Quantized {args.src_path} -> {args.out_path} ({args.dtype})")
+    if not args.no_report:
+        r = report(args.src_path, args.out_path)
+        print(f"size          {r['bytes']:>10d} -> {r['quantized_bytes']:>10d} bytes")
+        print(f"top-1 agree   {r['top1_agreement']:10.2%} of {r['positions']} positions")
+        print(f"perplexity    {r['perplexity']:10.4f} -> {r['quantized_perplexity']:10.4f}")
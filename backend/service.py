@@ -0,0 +1,194 @@
+import os
+import time
+import queue
+import random
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# process-pool inference service.
+# the pure python forward pass holds the GIL, so generation inside one web
+# process runs on one core no matter how many threads serve requests. this
+# layer hands /generate jobs to long-lived worker processes (each loads the
+# model once) and lets the web process just wait on the results.
+#
+#   request -> bounded queue -> dispatcher thread -> process pool
+#
+# the dispatcher micro-batches: jobs that arrive within batch_window seconds
+# and share (prefix, temperature, speculative) become one generate_names()
+# call, which shares the prefix and duplicate histories across all of them. a full queue
+# rejects new jobs (Overloaded) and jobs past their deadline fail with
+# TimeoutError instead of being run late.
+
+class Overloaded(Exception):
+    pass
+
+# ─── WORKER ──────────────────────────────────
+def _init_worker():
+    import model
+    model.get_model().load()  # the weights, once per worker process
+
+def _generate(prefix, temperature, count, seed, speculative=False, unique=False):
+    import model
+    lm = model.get_model()
+    rng = random.Random(seed) if seed is not None else None
+    if unique:
+        return lm.generate_unique(prefix, temperature, count, rng, speculative)
+    return lm.generate_names(prefix, temperature, count, rng, speculative)
+
+# ─── SERVICE ─────────────────────────────────
+class _Job:
+    __slots__ = ('prefix', 'temperature', 'count', 'seed', 'speculative', 'unique', 'deadline', 'future')
+
+    def __init__(self, prefix, temperature, count, seed, speculative, unique, deadline):
+        self.prefix = prefix
+        self.temperature = temperature
+        self.count = count
+        self.seed = seed
+        self.speculative = speculative
+        self.unique = unique
+        self.deadline = deadline
+        self.future = Future()
+
+class InferenceService:
+    def __init__(self, num_workers, max_queue=256, batch_window=0.005, timeout=10.0):
+        self.num_workers = num_workers
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self.queue = queue.Queue(max_queue)
+        # at most two batches in flight per worker; the rest wait in the
+        # bounded queue where they can be rejected or expire
+        self._in_flight = threading.BoundedSemaphore(2 * num_workers)
+        self.pool = ProcessPoolExecutor(
+            num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def submit(self, prefix, temperature, count, seed=None, speculative=False, unique=False):
+        # raises Overloaded; returns a Future, which can be cancelled while the
+        # job is still queued
+        job = _Job(prefix, temperature, count, seed, speculative, unique, time.monotonic() + self.timeout)
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            raise Overloaded(f"inference queue full ({self.queue.maxsize} jobs)")
+        return job.future
+
+    def generate(self, prefix, temperature, count, seed=None, speculative=False, unique=False):
+        # raises Overloaded or TimeoutError. unique=True returns
+        # (names, discarded) like MicroGPT.generate_unique()
+        future = self.submit(prefix, temperature, count, seed, speculative, unique)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # nobody waits for it any more: a still queued job is skipped
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        self.queue.put(None)
+        self._thread.join()
+        self.pool.shutdown(cancel_futures=True)
+
+    def _collect(self):
+        # first job blocks; then keep taking jobs until the window closes
+        job = self.queue.get()
+        if job is None:
+            return None
+        jobs = [job]
+        window_end = time.monotonic() + self.batch_window
+        while True:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self.queue.put(None)
+                break
+            jobs.append(job)
+        return jobs
+
+    def _dispatch(self):
+        while True:
+            jobs = self._collect()
+            if jobs is None:
+                return
+
+            groups = {}
+            now = time.monotonic()
+            for job in jobs:
+                if not job.future.set_running_or_notify_cancel():
+                    continue  # cancelled while queued, e.g. its client gave up
+                if self._expired(job, now):
+                    continue
+                # seeded jobs must replay their own rng stream and unique
+                # jobs dedupe only their own names, so neither is merged
+                key = (job.prefix, job.temperature, job.speculative, job.unique, job.seed,
+                       id(job) if job.seed is not None or job.unique else None)
+                groups.setdefault(key, []).append(job)
+
+            for (prefix, temperature, speculative, unique, seed, _), group in groups.items():
+                self._in_flight.acquire()
+                # the wait for a free slot can outlast a deadline
+                now = time.monotonic()
+                group = [job for job in group if not self._expired(job, now)]
+                if not group:
+                    self._in_flight.release()
+                    continue
+                total = sum(job.count for job in group)
+                try:
+                    batch = self.pool.submit(_generate, prefix, temperature, total, seed, speculative, unique)
+                except Exception as e:
+                    self._in_flight.release()
+                    for job in group:
+                        job.future.set_exception(e)
+                    continue
+                batch.add_done_callback(lambda f, group=group: self._finish(f, group))
+
+    def _expired(self, job, now):
+        if job.deadline < now:
+            job.future.set_exception(TimeoutError("job expired in queue"))
+            return True
+        return False
+
+    def _finish(self, batch, group):
+        self._in_flight.release()
+        try:
+            results = batch.result()
+        except Exception as e:
+            for job in group:
+                job.future.set_exception(e)
+            return
+        if len(group) == 1:
+            group[0].future.set_result(results)
+            return
+        offset = 0
+        for job in group:
+            job.future.set_result(results[offset:offset + job.count])
+            offset += job.count
+
+# ─── DEFAULT SERVICE ─────────────────────────
+# INFERENCE_WORKERS=N routes /generate through N worker processes
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    global _service
+    num_workers = int(os.environ.get('INFERENCE_WORKERS', 0))
+    if num_workers <= 0:
+        return None
+    with _service_lock:
+        if _service is None:
+            _service = InferenceService(
+                num_workers,
+                max_queue=int(os.environ.get('INFERENCE_QUEUE', 256)),
+                batch_window=float(os.environ.get('INFERENCE_BATCH_WINDOW', 0.005)),
+                timeout=float(os.environ.get('INFERENCE_TIMEOUT', 10)),
+            )
+    return _service
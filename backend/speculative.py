@@ -0,0 +1,150 @@
+import time
+import threading
+
+import metrics
+
+# speculative decoding.
+# a character n-gram model counted from the training docs guesses the next
+# few characters almost for free; the transformer then checks all of them in
+# one gpt_block() pass and keeps the prefix it agrees with.
+#
+# each draft token x (drawn from the draft distribution q) is accepted with
+# probability min(1, p(x) / q(x)), p being the transformer's distribution at
+# that position. the first rejected one is replaced by a sample from
+# max(0, p - q), renormalised, and the rest of the draft is dropped; if every
+# draft token is accepted one more token is sampled from the last p. this
+# makes every emitted token distributed exactly as in generate(), only the
+# random numbers are consumed differently, so seeded outputs differ.
+
+# ─── DRAFT MODEL ─────────────────────────────
+class NgramDraft:
+    def __init__(self, docs, tokenizer, order=4):
+        # order n: the next token is predicted from up to n - 1 previous ones,
+        # backing off to shorter contexts that occur in the docs
+        self.order = order
+        self.BOS = tokenizer.BOS
+        self.vocab_size = tokenizer.vocab_size
+        # counts[n][last n tokens] -> count of every next token
+        self.counts = [{} for _ in range(order)]
+        for doc in docs:
+            ids = [self.BOS] + tokenizer.encode(doc) + [self.BOS]
+            for i in range(1, len(ids)):
+                for n in range(min(order, i + 1)):
+                    context = tuple(ids[i - n:i])
+                    row = self.counts[n].get(context)
+                    if row is None:
+                        row = self.counts[n][context] = [0] * self.vocab_size
+                    row[ids[i]] += 1
+
+    def probs(self, context, temperature):
+        # context: token ids so far, starting with BOS
+        for n in range(min(self.order - 1, len(context)), -1, -1):
+            row = self.counts[n].get(tuple(context[len(context) - n:]))
+            if row is not None:
+                break
+        # same temperature as the target: p ** (1 / T), renormalised. counts
+        # are scaled by the largest first so the powers stay in [0, 1] and
+        # the most frequent token keeps weight 1 at any temperature
+        inv_temp = temperature ** -1
+        max_c = max(row)
+        weights = [(c / max_c) ** inv_temp for c in row]
+        inv_total = sum(weights) ** -1
+        return [w * inv_total for w in weights]
+
+# ─── SPECULATOR ──────────────────────────────
+class Speculator:
+    def __init__(self, engine, draft, block_size, draft_len=4, min_confidence=0.0):
+        self.engine = engine
+        self.draft = draft
+        self.block_size = block_size
+        self.draft_len = draft_len
+        # drafting stops after a token the draft gave less than this
+        # probability: unlikely guesses are mostly rejected and their
+        # positions would be computed for nothing
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.proposed = 0   # draft tokens checked by the transformer
+        self.accepted = 0   # of those, kept
+        self.passes = 0     # gpt_block() calls
+        self.tokens = 0     # tokens emitted, including the final BOS
+
+    def stats(self):
+        with self._lock:
+            return {
+                'proposed': self.proposed,
+                'accepted': self.accepted,
+                'passes': self.passes,
+                'tokens': self.tokens,
+                'acceptance_rate': self.accepted / self.proposed if self.proposed else 0.0,
+                'tokens_per_pass': self.tokens / self.passes if self.passes else 0.0,
+            }
+
+    def sample(self, token_id, pos_id, keys, values, context, temperature, rng):
+        # continues like generate(): token_id is fed at pos_id on top of the
+        # caches, context is the text so far (BOS first) for the draft model.
+        # returns the sampled ids, without the final BOS
+        engine, draft, BOS = self.engine, self.draft, self.draft.BOS
+        choices = range(draft.vocab_size)
+        context = list(context)
+        out = []
+        proposed = accepted = passes = tokens = 0
+        clock = time.perf_counter
+        t_draft = t_verify = 0.0
+        while pos_id < self.block_size:
+            t0 = clock()
+            drafts, qs = [], []
+            for _ in range(min(self.draft_len, self.block_size - pos_id - 1)):
+                q = draft.probs(context + drafts, temperature)
+                t = rng.choices(choices, weights=q)[0]
+                drafts.append(t)
+                qs.append(q)
+                if t == BOS or q[t] < self.min_confidence:
+                    break
+
+            # a trailing BOS needs no logits of its own
+            block = [token_id] + (drafts[:-1] if drafts and drafts[-1] == BOS else drafts)
+            t1 = clock()
+            logits = engine.gpt_block(block, pos_id, keys, values)
+            t_draft += t1 - t0
+            t_verify += clock() - t1
+            passes += 1
+            proposed += len(drafts)
+
+            n, next_id = 0, None
+            for t, q, l in zip(drafts, qs, logits):
+                p = engine.probs(l, temperature)
+                if rng.random() * q[t] < p[t]:
+                    n += 1
+                    continue
+                residual = [max(0.0, pi - qi) for pi, qi in zip(p, q)]
+                next_id = rng.choices(choices, weights=residual if any(residual) else p)[0]
+                break
+            accepted += n
+            if next_id is None and len(logits) > n:
+                p = engine.probs(logits[n], temperature)
+                next_id = rng.choices(choices, weights=p)[0]
+
+            # drop the cache entries of rejected drafts
+            pos_id += n + 1
+            for layer in keys:
+                del layer[pos_id:]
+            for layer in values:
+                del layer[pos_id:]
+
+            emitted = drafts[:n] + ([] if next_id is None else [next_id])
+            tokens += len(emitted)
+            if BOS in emitted:
+                out.extend(emitted[:emitted.index(BOS)])
+                break
+            out.extend(emitted)
+            context.extend(emitted)
+            token_id = emitted[-1]
+
+        metrics.stages(draft=(t_draft, passes), gpt_block=(t_verify, passes))
+        metrics.tokens_generated.inc(tokens)
+        with self._lock:
+            self.proposed += proposed
+            self.accepted += accepted
+            self.passes += passes
+            self.tokens += tokens
+        return out
@@ -0,0 +1,109 @@
+import numpy as np
+
+# static graph compilation for tensor.py functions.
+# the graph a training loss builds depends only on how many tokens it is
+# given, not on which tokens they are, yet every call rebuilds it: new
+# Tensor objects, new closures, a fresh topological sort. Compiled traces
+# the function once per input length and flattens the graph into a tape of
+# (kernels, output buffer, input buffers, args) instructions over buffers
+# that are allocated once. replaying the tape runs the same kernels as the
+# Tensor ops, forwards then in reverse, with no graph in between.
+#
+#   loss_fn = Compiled(doc_loss)
+#   loss = loss_fn(tokens)   # traces on the first call of each length
+#   loss.backward()          # accumulates into the leaves' .grad
+#
+# ints handed to the function are traced as Slots and may only reach the
+# graph as op args, alone (embed() rows, pick() indices) or in a list
+# (embed_rows() ids, sequence_nll() targets); any other use (arithmetic,
+# branching) is baked into the tape with the value seen while tracing.
+
+class Slot(int):
+    # an int input of a traced function, e.g. a token id
+    def __new__(cls, value, index):
+        self = int.__new__(cls, value)
+        self.index = index
+        return self
+
+# ─── TAPE ────────────────────────────────────
+class Tape:
+    def __init__(self, output):
+        self.leaves = []  # (slot, tensor): parameters, read live on every run
+        self.code = []    # (kernels, out slot, in slots, args, dynamic args)
+        self.vals = []
+        self.grads = []
+        self._buffers = []  # grads owned by the tape, zeroed before each backward
+        slots = {}
+        for t in output.topo():
+            slot = len(self.vals)
+            slots[id(t)] = slot
+            if t._op is None:
+                self.leaves.append((slot, t))
+                self.vals.append(None)
+                self.grads.append(None)
+                continue
+            kernels, args = t._op
+            dynamic = []
+            for k, a in enumerate(args):
+                if isinstance(a, Slot):
+                    dynamic.append((k, a.index))
+                elif isinstance(a, list) and any(isinstance(ai, Slot) for ai in a):
+                    dynamic.append((k, [ai.index if isinstance(ai, Slot) else None for ai in a]))
+            ins = tuple(slots[id(c)] for c in t._children)
+            self.code.append((kernels, slot, ins, args, dynamic))
+            self.vals.append(np.zeros(t.shape))
+            self.grads.append(np.zeros(t.shape))
+            self._buffers.append(self.grads[-1])
+        self.out = slots[id(output)]
+        self.data = self.vals[self.out]
+        self._args = [args for _, _, _, args, _ in self.code]
+        self._saved = [None] * len(self.code)
+
+    @classmethod
+    def trace(cls, fn, ints, *static):
+        return cls(fn([Slot(v, i) for i, v in enumerate(ints)], *static))
+
+    def forward(self, ints):
+        vals, run_args, saved = self.vals, self._args, self._saved
+        for slot, t in self.leaves:
+            vals[slot] = t.data
+        for i, ((forward, _), out, ins, args, dynamic) in enumerate(self.code):
+            if dynamic:
+                args = list(args)
+                for k, index in dynamic:
+                    if isinstance(index, list):
+                        # a list arg (e.g. targets) mixing inputs and constants
+                        args[k] = [a if i is None else ints[i] for a, i in zip(args[k], index)]
+                    else:
+                        args[k] = ints[index]
+            run_args[i] = args
+            saved[i] = forward(vals[out], [vals[s] for s in ins], args)
+        return self
+
+    def backward(self):
+        # gradient of the last forward()
+        vals, grads = self.vals, self.grads
+        for g in self._buffers:
+            g.fill(0.0)
+        for slot, t in self.leaves:
+            grads[slot] = t.grad
+        grads[self.out].fill(1.0)
+        for i in range(len(self.code) - 1, -1, -1):
+            (_, backward), out, ins, _, _ = self.code[i]
+            backward(vals[out], grads[out], [vals[s] for s in ins],
+                     [grads[s] for s in ins], self._saved[i], self._args[i])
+
+# ─── COMPILED ────────────────────────────────
+class Compiled:
+    # fn(ints, *static) -> scalar Tensor, replayed from one tape per input
+    # length and static args (shape parameters such as a batch size)
+    def __init__(self, fn):
+        self.fn = fn
+        self.tapes = {}
+
+    def __call__(self, ints, *static):
+        key = (len(ints), *static)
+        tape = self.tapes.get(key)
+        if tape is None:
+            tape = self.tapes[key] = Tape.trace(self.fn, ints, *static)
+        return tape.forward(ints)
@@ -0,0 +1,317 @@
+import numpy as np
+
+# tensor-level autograd engine.
+# Value tracks one scalar per node, so a single training step allocates tens of
+# thousands of nodes. a Tensor holds a whole vector or matrix as a numpy
+# float64 array, and every op below is one graph node with a hand-written,
+# vectorized backward. model.Value stays around as the scalar reference these
+# ops are checked against (see tests/test_tensor.py).
+
+# ─── TENSOR CLASS ────────────────────────────
+class Tensor:
+    def __init__(self, data, shape, children=(), backward=None):
+        self.data = np.asarray(data, dtype=np.float64).reshape(shape)
+        self.shape = tuple(shape)
+        self.grad = np.zeros(self.shape)
+        self._children = children
+        self._backward = backward
+        self._op = None  # (kernels, args) for nodes made by the ops below
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(rows, (len(rows), len(rows[0])))
+
+    def zero_grad(self):
+        self.grad = np.zeros(self.shape)
+
+    def topo(self):
+        # every node this one depends on, children before parents
+        topo = []
+        visited = set()
+        stack = [(self, False)]
+        while stack:
+            v, expanded = stack.pop()
+            if expanded:
+                topo.append(v)
+                continue
+            if id(v) in visited:
+                continue
+            visited.add(id(v))
+            stack.append((v, True))
+            for child in v._children:
+                if id(child) not in visited:
+                    stack.append((child, False))
+        return topo
+
+    def backward(self):
+        self.grad = np.ones(self.shape)
+        for v in reversed(self.topo()):
+            if v._backward is not None:
+                v._backward()
+
+# ─── KERNELS ─────────────────────────────────
+# every op is a pair of kernels over numpy arrays:
+#   forward(out, ins, args) -> saved               fills out in place
+#   backward(out, out_grad, ins, in_grads, saved, args)
+# ins are the children's data in order and in_grads their grads, which
+# backward accumulates into in place. the Tensor ops below and the compiled
+# tapes in tape.py both run these, so the two paths compute identical numbers.
+
+def _embed_forward(out, ins, args):
+    out[...] = ins[0][args[0]]
+
+def _embed_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0][args[0]] += out_grad
+
+def _embed_rows_forward(out, ins, args):
+    out[...] = ins[0][args[0]]
+
+def _embed_rows_backward(out, out_grad, ins, in_grads, saved, args):
+    # a row id may repeat, so scatter with add.at
+    np.add.at(in_grads[0], args[0], out_grad)
+
+def _add_forward(out, ins, args):
+    np.add(ins[0], ins[1], out=out)
+
+def _add_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0] += out_grad
+    in_grads[1] += out_grad
+
+def _scale_forward(out, ins, args):
+    np.multiply(ins[0], args[0], out=out)
+
+def _scale_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0] += out_grad * args[0]
+
+def _linear_forward(out, ins, args):
+    # x may hold several rows; each gets its own output row
+    x, w = ins
+    out[...] = x @ w.T
+
+def _linear_backward(out, out_grad, ins, in_grads, saved, args):
+    x, w = ins
+    xg, wg = in_grads
+    xg += out_grad @ w
+    # d(w) = g^T @ x, over every row of x
+    wg += out_grad.reshape(-1, w.shape[0]).T @ x.reshape(-1, w.shape[1])
+
+def _rmsnorm_forward(out, ins, args):
+    # normalizes along the last axis; saves the scale of every row
+    x = ins[0]
+    scale = (np.mean(x * x, axis=-1, keepdims=True) + 1e-5) ** -0.5
+    np.multiply(x, scale, out=out)
+    return scale
+
+def _rmsnorm_backward(out, out_grad, ins, in_grads, scale, args):
+    x = ins[0]
+    dot = np.sum(out_grad * x, axis=-1, keepdims=True)
+    in_grads[0] += out_grad * scale - scale ** 3 * dot / x.shape[-1] * x
+
+def _softmax_data(x):
+    # softmax along the last axis
+    exps = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return exps / np.sum(exps, axis=-1, keepdims=True)
+
+def _softmax_forward(out, ins, args):
+    out[...] = _softmax_data(ins[0])
+
+def _softmax_backward(out, out_grad, ins, in_grads, saved, args):
+    dot = np.sum(out_grad * out, axis=-1, keepdims=True)
+    in_grads[0] += out * (out_grad - dot)
+
+def _relu_forward(out, ins, args):
+    np.maximum(ins[0], 0.0, out=out)
+
+def _relu_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0] += out_grad * (ins[0] > 0)
+
+def _log_forward(out, ins, args):
+    np.log(ins[0], out=out)
+
+def _log_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0] += out_grad / ins[0]
+
+def _pick_forward(out, ins, args):
+    out[0] = ins[0][args[0]]
+
+def _pick_backward(out, out_grad, ins, in_grads, saved, args):
+    in_grads[0][args[0]] += out_grad[0]
+
+def _mean_forward(out, ins, args):
+    out[0] = sum(x[0] for x in ins) / len(ins)
+
+def _mean_backward(out, out_grad, ins, in_grads, saved, args):
+    g = out_grad[0] / len(ins)
+    for xg in in_grads:
+        xg[0] += g
+
+def _attend(q, k, v, n_head, mask=None):
+    # q: (..., n_q, n_embd), k/v: (..., n_kv, n_embd) -> output like q and the
+    # attention weights (..., n_head, n_q, n_kv). mask: (n_q, n_kv) booleans,
+    # False where a query may not look
+    *lead, n_q, n_embd = q.shape
+    n_kv = k.shape[-2]
+    head_dim = n_embd // n_head
+    # (..., n_head, rows, head_dim)
+    qh = q.reshape(*lead, n_q, n_head, head_dim).swapaxes(-2, -3)
+    kh = k.reshape(*lead, n_kv, n_head, head_dim).swapaxes(-2, -3)
+    vh = v.reshape(*lead, n_kv, n_head, head_dim).swapaxes(-2, -3)
+    scores = qh @ kh.swapaxes(-1, -2) * head_dim ** -0.5
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    weights = _softmax_data(scores)
+    out = (weights @ vh).swapaxes(-2, -3).reshape(q.shape)
+    return out, weights
+
+def _attend_backward(out_grad, q, k, v, weights, n_head):
+    # -> d(q), d(k), d(v) shaped like q, k, v
+    *lead, n_q, n_embd = q.shape
+    n_kv = k.shape[-2]
+    head_dim = n_embd // n_head
+    split = lambda x, n: x.reshape(*lead, n, n_head, head_dim).swapaxes(-2, -3)
+    join = lambda x, like: x.swapaxes(-2, -3).reshape(like.shape)
+    qh, kh, vh, gh = split(q, n_q), split(k, n_kv), split(v, n_kv), split(out_grad, n_q)
+    d_weights = gh @ vh.swapaxes(-1, -2)
+    d_v = weights.swapaxes(-1, -2) @ gh
+    # softmax backward; masked weights are 0 and get no gradient
+    d_scores = weights * (d_weights - np.sum(d_weights * weights, axis=-1, keepdims=True))
+    d_scores *= head_dim ** -0.5
+    return join(d_scores @ kh, q), join(d_scores.swapaxes(-1, -2) @ qh, k), join(d_v, v)
+
+def _attention_forward(out, ins, args):
+    # ins: q, then one key and one value per position seen so far
+    n_head = args[0]
+    n_pos = (len(ins) - 1) // 2
+    q = ins[0][None, :]
+    out_rows, weights = _attend(q, np.stack(ins[1:1 + n_pos]), np.stack(ins[1 + n_pos:]), n_head)
+    out[...] = out_rows[0]
+    return weights
+
+def _attention_backward(out, out_grad, ins, in_grads, weights, args):
+    n_head = args[0]
+    n_pos = (len(ins) - 1) // 2
+    k, v = np.stack(ins[1:1 + n_pos]), np.stack(ins[1 + n_pos:])
+    d_q, d_k, d_v = _attend_backward(out_grad[None, :], ins[0][None, :], k, v, weights, n_head)
+    in_grads[0] += d_q[0]
+    for t in range(n_pos):
+        in_grads[1 + t] += d_k[t]
+        in_grads[1 + n_pos + t] += d_v[t]
+
+def _causal_attention_forward(out, ins, args):
+    # q, k, v: (n_seq * seq_len, n_embd); row t of a sequence sees rows <= t
+    n_head, seq_len, n_embd = args
+    q, k, v = (x.reshape(-1, seq_len, n_embd) for x in ins)
+    mask = np.tri(seq_len, dtype=bool)
+    out_seq, weights = _attend(q, k, v, n_head, mask)
+    out[...] = out_seq.reshape(out.shape)
+    return weights
+
+def _causal_attention_backward(out, out_grad, ins, in_grads, weights, args):
+    n_head, seq_len, n_embd = args
+    q, k, v = (x.reshape(-1, seq_len, n_embd) for x in ins)
+    grads = _attend_backward(out_grad.reshape(q.shape), q, k, v, weights, n_head)
+    for xg, g in zip(in_grads, grads):
+        xg += g.reshape(xg.shape)
+
+def _sequence_nll_forward(out, ins, args):
+    # logits: (n_seq * seq_len, vocab). the loss is the mean negative log
+    # likelihood of each sequence, summed over sequences; target -1 is padding
+    targets, seq_len = args
+    targets = np.asarray(targets)
+    p = _softmax_data(ins[0])
+    valid = targets >= 0
+    rows = np.flatnonzero(valid)
+    nll = np.zeros(len(targets))
+    nll[rows] = -np.log(p[rows, targets[rows]])
+    # every position of a sequence is weighted by 1 / its number of targets
+    counts = valid.reshape(-1, seq_len).sum(axis=1)
+    weight = np.repeat(1.0 / counts, seq_len) * valid
+    out[0] = np.sum(nll * weight)
+    return p, rows, targets, weight
+
+def _sequence_nll_backward(out, out_grad, ins, in_grads, saved, args):
+    # d(mean nll)/d(logits) = (p - onehot(target)) / count
+    p, rows, targets, weight = saved
+    d_logits = p * (weight * out_grad[0])[:, None]
+    d_logits[rows, targets[rows]] -= weight[rows] * out_grad[0]
+    in_grads[0] += d_logits
+
+EMBED = (_embed_forward, _embed_backward)
+EMBED_ROWS = (_embed_rows_forward, _embed_rows_backward)
+ADD = (_add_forward, _add_backward)
+SCALE = (_scale_forward, _scale_backward)
+LINEAR = (_linear_forward, _linear_backward)
+RMSNORM = (_rmsnorm_forward, _rmsnorm_backward)
+SOFTMAX = (_softmax_forward, _softmax_backward)
+RELU = (_relu_forward, _relu_backward)
+LOG = (_log_forward, _log_backward)
+PICK = (_pick_forward, _pick_backward)
+MEAN = (_mean_forward, _mean_backward)
+ATTENTION = (_attention_forward, _attention_backward)
+CAUSAL_ATTENTION = (_causal_attention_forward, _causal_attention_backward)
+SEQUENCE_NLL = (_sequence_nll_forward, _sequence_nll_backward)
+
+# ─── OPS ─────────────────────────────────────
+def apply(kernels, children, shape, args=()):
+    forward, backward = kernels
+    out = Tensor(np.zeros(shape), shape, children)
+    saved = forward(out.data, [c.data for c in children], args)
+    def run_backward():
+        backward(out.data, out.grad, [c.data for c in children],
+                 [c.grad for c in children], saved, args)
+    out._backward = run_backward
+    out._op = (kernels, args)
+    return out
+
+def embed(table, row_id):
+    return apply(EMBED, (table,), table.shape[1:], (row_id,))
+
+def embed_rows(table, row_ids):
+    # (len(row_ids), ncols)
+    return apply(EMBED_ROWS, (table,), (len(row_ids), table.shape[1]), (list(row_ids),))
+
+def add(a, b):
+    return apply(ADD, (a, b), a.shape)
+
+def scale(x, c):
+    return apply(SCALE, (x,), x.shape, (c,))
+
+def linear(x, w):
+    # x: (nin,) or (rows, nin)  w: (nout, nin)  ->  (nout,) or (rows, nout)
+    return apply(LINEAR, (x, w), (*x.shape[:-1], w.shape[0]))
+
+def rmsnorm(x):
+    return apply(RMSNORM, (x,), x.shape)
+
+def softmax(x):
+    return apply(SOFTMAX, (x,), x.shape)
+
+def relu(x):
+    return apply(RELU, (x,), x.shape)
+
+def log(x):
+    return apply(LOG, (x,), x.shape)
+
+def pick(x, index):
+    return apply(PICK, (x,), (1,), (index,))
+
+def mean(xs):
+    return apply(MEAN, tuple(xs), (1,))
+
+def attention(q, keys, values, n_head):
+    # causal multi-head attention for the newest position.
+    # keys/values hold one (n_embd,) tensor per position seen so far,
+    # so the query can only look backwards.
+    return apply(ATTENTION, (q, *keys, *values), q.shape, (n_head,))
+
+def causal_attention(q, k, v, n_head, seq_len):
+    # whole-sequence multi-head attention. q, k, v: (n_seq * seq_len, n_embd)
+    # holding n_seq sequences back to back; each row attends to the rows of
+    # its own sequence up to and including itself. padding at the end of a
+    # sequence is never seen by the real positions before it.
+    return apply(CAUSAL_ATTENTION, (q, k, v), q.shape, (n_head, seq_len, q.shape[-1]))
+
+def sequence_nll(logits, targets, seq_len):
+    # softmax + cross entropy for (n_seq * seq_len, vocab) logits; targets
+    # has one id per row, -1 on padding rows
+    return apply(SEQUENCE_NLL, (logits,), (1,), (list(targets), seq_len))
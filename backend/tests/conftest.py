@@ -0,0 +1,18 @@
+import io
+import os
+import sys
+import contextlib
+
+import pytest
+
+# the backend modules import each other by bare name (import model, ...)
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+@pytest.fixture(scope='session')
+def im():
+    # the training script, set up on input.txt with its default seed
+    import implemented_microgpt
+    with contextlib.redirect_stdout(io.StringIO()):
+        implemented_microgpt.setup(os.path.join(BACKEND, 'input.txt'))
+    return implemented_microgpt
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+import corpus
+
+# the training loader: every epoch a fresh permutation of the docs, and a
+# saved position continues the same stream of batches.
+
+@pytest.fixture
+def docs(tmp_path):
+    # doc i is the letter pattern of i, so a batch item names its doc
+    names = [''.join('abcdefghij'[int(d)] for d in str(i)) for i in range(50)]
+    path = tmp_path / 'docs.txt'
+    path.write_text('\n'.join(names) + '\n')
+    return corpus.ensure(str(path), str(tmp_path / 'docs.tok')), names
+
+def epoch_order(loader, dataset, names):
+    itos = dataset.tokenizer.itos
+    batches = [next(loader) for _ in range(len(names) // loader.batch_size)]
+    return [names.index(''.join(itos[t] for t in doc[1:-1])) for b in batches for doc in b]
+
+def test_epochs_are_permutations(docs):
+    dataset, names = docs
+    loader = dataset.batches(5, seed=0)
+    orders = [epoch_order(loader, dataset, names) for _ in range(4)]
+    for order in orders:
+        assert sorted(order) == list(range(len(names)))
+        # not a rotation or reflection of the file order (an arithmetic
+        # progression mod n has a single step between neighbours)
+        steps = {(b - a) % len(names) for a, b in zip(order, order[1:])}
+        assert len(steps) > 1
+    assert len({tuple(order) for order in orders}) == len(orders)
+
+def test_restore_continues_the_same_batches(docs):
+    dataset, _ = docs
+    loader = dataset.batches(7, seed=3)
+    for _ in range(12):
+        next(loader)
+    state, rng_state = loader.state(), loader.rng.getstate()
+    expected = [next(loader) for _ in range(30)]
+
+    rng = random.Random()
+    rng.setstate(rng_state)
+    restored = corpus.Loader(dataset, 7, rng)
+    restored.restore(state)
+    assert [next(restored) for _ in range(30)] == expected
+
+def test_empty_corpus(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_text('\n')
+    dataset = corpus.ensure(str(path), str(tmp_path / 'empty.tok'))
+    with pytest.raises(ValueError):
+        dataset.batches(4)
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import model
+from model import Value
+from conftest import BACKEND
+
+# the fused rmsnorm/softmax/linear nodes against the scalar Value
+# compositions they replaced: same forward values, same gradients.
+
+TOL = 1e-12
+
+# ─── SCALAR REFERENCES ───────────────────────
+def scalar_rmsnorm(x):
+    ms = sum(xi * xi for xi in x) / len(x)
+    scale = (ms + 1e-5) ** -0.5
+    return [xi * scale for xi in x]
+
+def scalar_softmax(logits):
+    max_val = max(val.data for val in logits)
+    exps = [(val - max_val).exp() for val in logits]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+def scalar_linear(x, w):
+    output = []
+    for wo in w:
+        row_sum = 0
+        for wi, xi in zip(wo, x):
+            row_sum = row_sum + wi * xi
+        output.append(row_sum)
+    return output
+
+# ─── OPS ─────────────────────────────────────
+def values(rng, n, low=-1.0, high=1.0):
+    return [Value(rng.uniform(low, high)) for _ in range(n)]
+
+def check(fused, scalar, make_inputs):
+    # forward values and d(sum(out * r))/d(inputs) of both versions
+    rng = random.Random(0)
+    data = make_inputs(rng)
+    results = []
+    for op in (fused, scalar):
+        ins = [[[Value(v.data) for v in row] for row in x] if isinstance(x[0], list)
+               else [Value(v.data) for v in x] for x in data]
+        out = op(*ins)
+        r = random.Random(1)
+        loss = sum((o * r.uniform(-1, 1) for o in out), Value(0.0))
+        loss.backward()
+        leaves = [v for x in ins for v in (sum(x, []) if isinstance(x[0], list) else x)]
+        results.append(([o.data for o in out], [v.grad for v in leaves]))
+    (fused_out, fused_grads), (scalar_out, scalar_grads) = results
+    assert fused_out == scalar_out
+    assert fused_grads == pytest.approx(scalar_grads, abs=TOL, rel=0)
+
+def test_rmsnorm():
+    check(model.rmsnorm, scalar_rmsnorm, lambda rng: [values(rng, 16)])
+
+def test_softmax():
+    check(model.softmax, scalar_softmax, lambda rng: [values(rng, 27, -4.0, 4.0)])
+
+def test_linear():
+    check(model.linear, scalar_linear,
+          lambda rng: [values(rng, 16), [values(rng, 16) for _ in range(64)]])
+
+# ─── WHOLE MODEL ─────────────────────────────
+def loss_grads(lm, tokens):
+    for p in lm.params:
+        p.grad = 0
+    keys, vals = [[] for _ in range(model.n_layer)], [[] for _ in range(model.n_layer)]
+    nll = []
+    for pos_id in range(len(tokens) - 1):
+        probs = model.softmax(lm.gpt(tokens[pos_id], pos_id, keys, vals))
+        nll.append(-probs[tokens[pos_id + 1]].log())
+    loss = sum(nll, Value(0.0)) * (1 / len(nll))
+    loss.backward()
+    return loss.data, [p.grad for p in lm.params]
+
+def test_gpt_gradients_match_scalar_ops(monkeypatch, tmp_path):
+    lm = model.MicroGPT(str(tmp_path / 'model.bin'), f'{BACKEND}/input.txt')
+    tokens = [lm.BOS] + lm.tokenizer.encode('razorpay') + [lm.BOS]
+    fused_loss, fused_grads = loss_grads(lm, tokens)
+
+    monkeypatch.setattr(model, 'rmsnorm', scalar_rmsnorm)
+    monkeypatch.setattr(model, 'softmax', scalar_softmax)
+    monkeypatch.setattr(model, 'linear', scalar_linear)
+    scalar_loss, scalar_grads = loss_grads(lm, tokens)
+
+    assert fused_loss == scalar_loss
+    assert fused_grads == pytest.approx(scalar_grads, abs=TOL, rel=0)
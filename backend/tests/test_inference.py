@@ -0,0 +1,61 @@
+import os
+import random
+
+import pytest
+
+import model
+from conftest import BACKEND
+
+# FloatGPT (the serving engine) against the Value graph of MicroGPT.gpt():
+# both must produce the same logits bit for bit, and so the same tokens for
+# a fixed seed.
+
+SEQUENCES = ['', 'a', 'snap', 'zepto', 'abcdefghiklmnop']
+
+@pytest.fixture(scope='module', params=['trained', 'random'])
+def lm(request, tmp_path_factory):
+    if request.param == 'trained':
+        lm = model.MicroGPT(os.path.join(BACKEND, 'model.bin'))
+    else:
+        # no checkpoint: serves the random init, vocab from the corpus
+        missing = tmp_path_factory.mktemp('untrained') / 'model.bin'
+        lm = model.MicroGPT(str(missing), os.path.join(BACKEND, 'input.txt'))
+    return lm.load()
+
+def empty_cache():
+    return [[] for _ in range(model.n_layer)], [[] for _ in range(model.n_layer)]
+
+@pytest.mark.parametrize('text', SEQUENCES)
+def test_logits_match_value_path(lm, text):
+    token_ids = [lm.BOS] + lm.tokenizer.encode(text)
+    value_keys, value_values = empty_cache()
+    float_keys, float_values = empty_cache()
+    for pos_id, token_id in enumerate(token_ids):
+        expected = [l.data for l in lm.gpt(token_id, pos_id, value_keys, value_values)]
+        got = lm.engine.gpt(token_id, pos_id, float_keys, float_values)
+        assert got == expected
+
+def value_generate(lm, prefix, temperature, rng):
+    # generate() on the Value path, consuming rng the same way
+    token_ids = lm.tokenizer.encode(prefix)
+    keys, values = empty_cache()
+    for pos_id, token_id in enumerate(token_ids):
+        lm.gpt(token_id, pos_id, keys, values)
+    token_id = token_ids[-1] if prefix else lm.BOS
+    sample = list(prefix)
+    inv_temp = temperature ** -1
+    for pos_id in range(len(prefix), model.block_size):
+        logits = lm.gpt(token_id, pos_id, keys, values)
+        probs = model.softmax([l * inv_temp for l in logits])
+        token_id = rng.choices(range(lm.vocab_size), weights=[p.data for p in probs])[0]
+        if token_id == lm.BOS:
+            break
+        sample.append(lm.tokenizer.itos[token_id])
+    return ''.join(sample)
+
+@pytest.mark.parametrize('prefix', ['', 'sn', 'cred'])
+@pytest.mark.parametrize('temperature', [0.5, 1.0])
+def test_seeded_generate_matches_value_path(lm, prefix, temperature):
+    for seed in range(5):
+        expected = value_generate(lm, prefix, temperature, random.Random(seed))
+        assert lm.generate(prefix, temperature, random.Random(seed)) == expected
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import tensor
+from parallel import DataParallel, compute_grads, shard
+
+# the data-parallel all-reduce must give the gradient of one process
+# running the whole batch.
+
+def batch_loss(im):
+    # sum over docs of each doc's mean loss, as in the training script
+    def loss_fn(batch):
+        seq_len = min(im.block_size, max(len(tokens) for tokens in batch) - 1)
+        token_ids, targets = [], []
+        for tokens in batch:
+            tokens = list(tokens[:seq_len + 1])
+            pad = seq_len + 1 - len(tokens)
+            token_ids += tokens[:-1] + [im.BOS] * pad
+            targets += tokens[1:] + [-1] * pad
+        return tensor.sequence_nll(im.gpt_sequence(token_ids, seq_len), targets, seq_len)
+    return loss_fn
+
+def test_shard():
+    assert shard(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert shard([0, 1], 3) == [[0], [1], []]
+
+@pytest.mark.parametrize('num_workers', [2, 3])
+def test_grads_match_single_process(im, num_workers):
+    loss_fn = batch_loss(im)
+    batches = im.dataset.batches(8, seed=0)
+    trainer = DataParallel(im.params, loss_fn, num_workers)
+    try:
+        for _ in range(3):
+            batch = next(batches)
+            for p in im.params:
+                p.zero_grad()
+            expected_loss = compute_grads(loss_fn, batch)
+            expected = [p.grad.copy() for p in im.params]
+
+            loss = trainer.grads_for(batch)
+            assert loss == pytest.approx(expected_loss, abs=1e-12)
+            for p, g in zip(im.params, expected):
+                assert np.allclose(p.grad, g, atol=1e-12, rtol=0)
+    finally:
+        trainer.close()
+        for p in im.params:
+            p.zero_grad()
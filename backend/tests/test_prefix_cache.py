@@ -0,0 +1,25 @@
+from prefix_cache import PrefixCache
+
+# hit/miss accounting of the prompt prefix cache
+
+def counters(cache):
+    return cache.hits, cache.partial_hits, cache.misses
+
+def cached_positions(n, n_layer=1):
+    return [[[float(p)] for p in range(n)] for _ in range(n_layer)]
+
+def test_lookup_counts():
+    cache = PrefixCache()
+    assert cache.lookup([3, 1], 1)[0] == 0
+    assert counters(cache) == (0, 0, 1)
+
+    cache.insert([3, 1], cached_positions(2), cached_positions(2))
+    assert cache.lookup([3, 1], 1)[0] == 2
+    assert cache.lookup([3, 1, 4], 1)[0] == 2
+    assert counters(cache) == (1, 1, 1)
+
+def test_empty_prefix_is_not_counted():
+    cache = PrefixCache()
+    matched, keys, values = cache.lookup([], 2)
+    assert (matched, keys, values) == (0, [[], []], [[], []])
+    assert counters(cache) == (0, 0, 0)
@@ -0,0 +1,75 @@
+import os
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import model
+from speculative import NgramDraft
+from conftest import BACKEND
+
+# the n-gram draft's distribution at any temperature, and speculative
+# generate against plain generate: same output distribution.
+
+TEMPERATURES = [1e-300, 0.002, 0.005, 0.5, 1.0, 10.0]
+CONTEXTS = ['', 's', 'sn', 'zept', 'qqqq']
+
+@pytest.fixture(scope='module')
+def lm():
+    return model.MicroGPT(os.path.join(BACKEND, 'model.bin')).load()
+
+def context_ids(lm, text):
+    return [lm.BOS] + lm.tokenizer.encode(text)
+
+@pytest.mark.parametrize('scale', [1, 10 ** 6])
+@pytest.mark.parametrize('temperature', TEMPERATURES)
+def test_draft_probs_normalised(lm, temperature, scale):
+    # scale stands in for a much larger corpus: every count multiplied
+    draft = NgramDraft(lm.docs, lm.tokenizer)
+    for rows in draft.counts:
+        for row in rows.values():
+            row[:] = [c * scale for c in row]
+    for text in CONTEXTS:
+        q = draft.probs(context_ids(lm, text), temperature)
+        assert len(q) == lm.vocab_size
+        assert all(0.0 <= qi <= 1.0 for qi in q)
+        assert math.isclose(sum(q), 1.0, rel_tol=1e-9)
+
+def test_draft_probs_greedy_at_low_temperature(lm):
+    draft = NgramDraft(lm.docs, lm.tokenizer)
+    context = context_ids(lm, 'sn')
+    row = draft.counts[2][tuple(context[-2:])]
+    q = draft.probs(context, 1e-300)
+    assert q[row.index(max(row))] == max(q) > 0.0
+
+def chi_square_homogeneity(a, b):
+    # two-sample chi-square over the categories of Counters a and b (same
+    # total), rare categories pooled; returns (statistic, degrees of freedom)
+    common, rare_a, rare_b = [], 0, 0
+    for key in set(a) | set(b):
+        if a[key] + b[key] < 10:
+            rare_a, rare_b = rare_a + a[key], rare_b + b[key]
+        else:
+            common.append((a[key], b[key]))
+    if rare_a + rare_b:
+        common.append((rare_a, rare_b))
+    stat = sum((x - y) ** 2 / (x + y) for x, y in common)
+    return stat, len(common) - 1
+
+def chi_square_critical(df, z=3.09):
+    # Wilson-Hilferty approximation of the chi-square quantile; z = 3.09 is
+    # the one-sided 0.001 level
+    c = 2 / (9 * df)
+    return df * (1 - c + z * math.sqrt(c)) ** 3
+
+@pytest.mark.parametrize('prefix', ['', 's'])
+def test_speculative_matches_generate_distribution(lm, prefix):
+    n = 1000
+    plain = lm.generate_batch(prefix, 1.0, n, random.Random(0))
+    speculative = [lm.generate_speculative(prefix, 1.0, random.Random(seed)) for seed in range(n)]
+    # the first sampled char, and the length (which every position decides)
+    for feature in (lambda s: s[len(prefix):len(prefix) + 1], len):
+        stat, df = chi_square_homogeneity(Counter(map(feature, plain)),
+                                          Counter(map(feature, speculative)))
+        assert stat < chi_square_critical(df)
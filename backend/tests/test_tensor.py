@@ -0,0 +1,182 @@
+import random
+
+import numpy as np
+import pytest
+
+import model
+import tensor
+from model import Value
+from tensor import Tensor
+from conftest import BACKEND
+
+# gradient checks: every tensor.py op, and the whole training loss, against
+# the same computation on scalar model.Value nodes.
+
+TOL = 1e-10
+N_HEAD = 4
+
+def random_tensor(rng, shape, low=-1.0, high=1.0):
+    return Tensor([rng.uniform(low, high) for _ in range(int(np.prod(shape)))], shape)
+
+def to_values(t):
+    # nested lists of Values holding the data of t
+    return np.vectorize(Value, otypes=[object])(t.data).tolist()
+
+def flat(nested):
+    return np.array(nested, dtype=object).ravel()
+
+def backward_from(out, grad):
+    # backward() seeded with grad instead of ones
+    out.grad = np.asarray(grad, dtype=np.float64).reshape(out.shape)
+    for v in reversed(out.topo()):
+        if v._backward is not None:
+            v._backward()
+
+def check(op, value_op, shapes, low=-1.0, high=1.0):
+    # compares op(*inputs) and d(sum(out * r))/d(inputs) with value_op, the
+    # same function written on Values
+    rng = random.Random(0)
+    ins = [random_tensor(rng, shape, low, high) for shape in shapes]
+    out = op(*ins)
+    r = [rng.uniform(-1, 1) for _ in range(out.data.size)]
+    backward_from(out, r)
+
+    value_ins = [to_values(t) for t in ins]
+    value_out = flat(value_op(*value_ins))
+    assert np.allclose([v.data for v in value_out], out.data.ravel(), atol=TOL, rtol=0)
+    sum((v * ri for v, ri in zip(value_out, r)), Value(0.0)).backward()
+    for t, values in zip(ins, value_ins):
+        value_grad = [v.grad for v in flat(values)]
+        assert np.allclose(t.grad.ravel(), value_grad, atol=TOL, rtol=0)
+
+# ─── SCALAR REFERENCES ───────────────────────
+def value_attend(q, keys, values, n_head):
+    head_dim = len(q) // n_head
+    out = []
+    for h in range(n_head):
+        start, end = h * head_dim, (h + 1) * head_dim
+        scores = [sum((q[j] * k[j] for j in range(start, end)), Value(0.0)) * head_dim ** -0.5
+                  for k in keys]
+        weights = model.softmax(scores)
+        for j in range(start, end):
+            out.append(sum((a * v[j] for a, v in zip(weights, values)), Value(0.0)))
+    return out
+
+def value_causal_attention(q, k, v, n_head, seq_len):
+    out = []
+    for row in range(len(q)):
+        first = row - row % seq_len
+        out.append(value_attend(q[row], k[first:row + 1], v[first:row + 1], n_head))
+    return out
+
+def value_sequence_nll(logits, targets, seq_len):
+    total = Value(0.0)
+    for first in range(0, len(targets), seq_len):
+        nll = [-model.softmax(logits[t])[targets[t]].log()
+               for t in range(first, first + seq_len) if targets[t] >= 0]
+        total = total + sum(nll, Value(0.0)) * (1 / len(nll))
+    return [total]
+
+# ─── OPS ─────────────────────────────────────
+def test_embed_rows():
+    ids = [3, 0, 3, 5]
+    check(lambda table: tensor.embed_rows(table, ids),
+          lambda table: [table[i] for i in ids], [(6, 8)])
+
+def test_add_and_scale():
+    check(lambda a, b: tensor.scale(tensor.add(a, b), -0.7),
+          lambda a, b: [[(x + y) * -0.7 for x, y in zip(ra, rb)] for ra, rb in zip(a, b)],
+          [(3, 8), (3, 8)])
+
+@pytest.mark.parametrize('x_shape', [(8,), (5, 8)])
+def test_linear(x_shape):
+    rows = lambda x: x if len(x_shape) == 2 else [x]
+    check(tensor.linear,
+          lambda x, w: [model.linear(row, w) for row in rows(x)],
+          [x_shape, (6, 8)])
+
+def test_rmsnorm():
+    check(tensor.rmsnorm, lambda x: [model.rmsnorm(row) for row in x], [(4, 16)])
+
+def test_softmax():
+    check(tensor.softmax, lambda x: [model.softmax(row) for row in x], [(4, 10)], -3.0, 3.0)
+
+def test_relu():
+    check(tensor.relu, lambda x: [[xi.relu() for xi in row] for row in x], [(4, 16)])
+
+def test_log_pick_mean():
+    check(lambda x: tensor.mean([tensor.log(tensor.pick(x, 2)), tensor.log(tensor.pick(x, 5))]),
+          lambda x: [(x[2].log() + x[5].log()) * 0.5], [(8,)], 0.1, 2.0)
+
+def test_attention():
+    n_pos = 3
+    check(lambda q, *kv: tensor.attention(q, kv[:n_pos], kv[n_pos:], N_HEAD),
+          lambda q, *kv: value_attend(q, kv[:n_pos], kv[n_pos:], N_HEAD),
+          [(16,)] * (1 + 2 * n_pos))
+
+def test_causal_attention():
+    seq_len = 4
+    check(lambda q, k, v: tensor.causal_attention(q, k, v, N_HEAD, seq_len),
+          lambda q, k, v: value_causal_attention(q, k, v, N_HEAD, seq_len),
+          [(2 * seq_len, 16)] * 3)
+
+def test_sequence_nll():
+    # two sequences of 4, the second padded after two targets
+    targets, seq_len = [1, 4, 0, 2, 3, 3, -1, -1], 4
+    check(lambda logits: tensor.sequence_nll(logits, targets, seq_len),
+          lambda logits: value_sequence_nll(logits, targets, seq_len),
+          [(8, 5)], -2.0, 2.0)
+
+# ─── TRAINING LOSS ───────────────────────────
+def test_training_loss_matches_value_model(im, tmp_path):
+    # the training script's whole-sequence loss on one document against
+    # MicroGPT.gpt() (Value graph) over the same weights, token by token
+    lm = model.MicroGPT(str(tmp_path / 'model.bin'), f'{BACKEND}/input.txt')
+    for name, t in im.state_dict.items():
+        for row, data in zip(lm.state_dict[name], t.data):
+            for p, d in zip(row, data):
+                p.data = float(d)
+
+    tokens = [lm.BOS] + lm.tokenizer.encode('snapdeal') + [lm.BOS]
+    seq_len = len(tokens) - 1
+    for p in im.params:
+        p.zero_grad()
+    loss = tensor.sequence_nll(im.gpt_sequence(tokens[:-1], seq_len), tokens[1:], seq_len)
+    loss.backward()
+
+    keys, values = [[] for _ in range(model.n_layer)], [[] for _ in range(model.n_layer)]
+    nll = []
+    for pos_id in range(seq_len):
+        probs = model.softmax(lm.gpt(tokens[pos_id], pos_id, keys, values))
+        nll.append(-probs[tokens[pos_id + 1]].log())
+    value_loss = sum(nll, Value(0.0)) * (1 / len(nll))
+    value_loss.backward()
+
+    assert abs(loss.data[0] - value_loss.data) < TOL
+    for name, t in im.state_dict.items():
+        value_grad = [[p.grad for p in row] for row in lm.state_dict[name]]
+        assert np.allclose(t.grad, value_grad, atol=TOL, rtol=0), name
+    for p in im.params:
+        p.zero_grad()
+
+def test_compiled_tape_matches_eager(im):
+    # the tape traced on one batch, replayed on another of the same shape
+    from tape import Compiled
+    def loss_fn(ints, seq_len):
+        return tensor.sequence_nll(im.gpt_sequence(ints[:seq_len], seq_len), ints[seq_len:], seq_len)
+
+    compiled = Compiled(loss_fn)
+    seq_len = 6
+    for text in ['zepto', 'cred', 'swigy']:
+        tokens = [im.BOS] + im.tokenizer.encode(text) + [im.BOS]
+        pad = seq_len + 1 - len(tokens)
+        ints = tokens[:-1] + [im.BOS] * pad + tokens[1:] + [-1] * pad
+        loss_fn(ints, seq_len).backward()
+        eager = [p.grad for p in im.params]
+        for p in im.params:
+            p.zero_grad()
+        loss = compiled(ints, seq_len)
+        loss.backward()
+        for p, g in zip(im.params, eager):
+            assert np.array_equal(p.grad, g)
+            p.zero_grad()
@@ -0,0 +1,47 @@
+# character-level tokenizer.
+# ids are positions in the sorted character list, BOS is the last id.
+# encoding goes through a precomputed char -> id dict instead of
+# unique_chars.index(ch), which scanned the whole vocab for every character.
+
+# ─── TOKENIZER ───────────────────────────────
+class Tokenizer:
+    def __init__(self, chars):
+        self.chars = list(chars)
+        self.stoi = {ch: i for i, ch in enumerate(self.chars)}
+        self.BOS = len(self.chars)
+        self.vocab_size = len(self.chars) + 1
+        # decode table: id -> char, BOS decodes to ''
+        self.itos = self.chars + ['']
+
+    @classmethod
+    def from_docs(cls, docs):
+        return cls(sorted(set(''.join(docs))))
+
+    def __contains__(self, ch):
+        return ch in self.stoi
+
+    def unknown(self, text):
+        # first character not in the vocab, or None
+        for ch in text:
+            if ch not in self.stoi:
+                return ch
+        return None
+
+    def encode(self, text):
+        # raises KeyError on characters outside the vocab
+        return list(map(self.stoi.__getitem__, text))
+
+    def encode_lenient(self, text):
+        # unknown characters become None
+        return list(map(self.stoi.get, text))
+
+    def decode(self, ids):
+        return ''.join(map(self.itos.__getitem__, ids))
+
+    def encode_batch(self, texts, lenient=False):
+        lookup = self.stoi.get if lenient else self.stoi.__getitem__
+        return [list(map(lookup, text)) for text in texts]
+
+    def decode_batch(self, batch):
+        lookup = self.itos.__getitem__
+        return [''.join(map(lookup, ids)) for ids in batch]
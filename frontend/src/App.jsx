@@ -14,6 +14,27 @@ function mockAttention(chars) {
   return chars.map((_, i, arr) => Math.exp(-(arr.length - 1 - i) * 0.6));
 }
 
+// arrays from /inspect: { shape, dtype: "f32", data: base64 little-endian float32 }
+function decodeArray({ shape, data }) {
+  const bytes = Uint8Array.from(atob(data), c => c.charCodeAt(0));
+  return { shape, values: new Float32Array(bytes.buffer) };
+}
+function realEmbeddings(inspected) {
+  const { shape: [n, d], values } = decodeArray(inspected.embeddings.token);
+  const scale = Math.max(...values.map(Math.abs)) || 1;
+  return Array.from({ length: n }, (_, i) => Array.from(values.subarray(i * d, (i + 1) * d), v => v / scale));
+}
+function realAttention(inspected) {
+  // how the last position (the step that predicts the next char) weighs the
+  // prefix positions, averaged over the heads of the last layer
+  const { shape: [L, H, Q, K], values } = decodeArray(inspected.attention);
+  return Array.from({ length: K - 1 }, (_, k) => {
+    let sum = 0;
+    for (let h = 0; h < H; h++) sum += values[(((L - 1) * H + h) * Q + Q - 1) * K + k];
+    return sum / H;
+  });
+}
+
 function Scanline() {
   return (
     <div style={{ position:"fixed", inset:0, pointerEvents:"none", zIndex:9999, overflow:"hidden" }}>
@@ -288,15 +309,25 @@ export default function App() {
     }
     await sleep(700);
 
+    // real internals from the backend; mock values if it can't provide them
+    let inspected = null;
+    if (inputPrefix) {
+      try {
+        const r = await fetch(`${API_BASE}/inspect?prefix=${encodeURIComponent(inputPrefix)}`);
+        if (r.ok) inspected = await r.json();
+      } catch { inspected = null; }
+    }
+
     // Stage 2 — Embed
     setStage(2);
-    setEmbeddings(tokenData.map(t => ({ ...t, embedding: mockEmbedding(t.id >= 0 ? t.id : 0) })));
+    const embedded = inspected ? realEmbeddings(inspected) : null;
+    setEmbeddings(tokenData.map((t, i) => ({ ...t, embedding: embedded ? embedded[i] : mockEmbedding(t.id >= 0 ? t.id : 0) })));
     await sleep(1300);
 
     // Stage 3 — Attention
     if (tokenData.length > 1) {
       setStage(3);
-      setAttentionWeights(mockAttention(tokenData.map(t => t.char)));
+      setAttentionWeights(inspected ? realAttention(inspected) : mockAttention(tokenData.map(t => t.char)));
       await sleep(1500);
     }
 